@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import duckdb
+import numpy as np
+import pandas as pd
+from data_fetcher import BulkLoader, create_database_schema, insert_market_data
+import equal_weighted_index_composition as composition
+from index_outputs import COMPOSITION, CHANGES, PERFORMANCE, write_table
+from index_reports import create_pdf
+from weighting import WEIGHTING_SCHEMES, get_schemes
+from load_test import callback_body
+
+# =============================================
+# Synthetic Market
+# =============================================
+def synthetic_market(tickers: int = 150, years: float = 3, seed: int = 0):
+    """Deterministic random-walk closing prices and share counts for `tickers` over `years` of
+    business days; returns (market_data frame, shares by ticker)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=int(years * 252))
+    symbols = np.array([f"T{i:04d}" for i in range(tickers)])
+    drift = rng.normal(0.0003, 0.0002, tickers)
+    volatility = rng.uniform(0.01, 0.03, tickers)
+    log_returns = rng.normal(drift, volatility, (len(dates), tickers))
+    prices = rng.uniform(20, 500, tickers) * np.exp(np.cumsum(log_returns, axis=0))
+    shares = pd.Series(rng.integers(100_000_000, 10_000_000_000, tickers), index=symbols)
+    market = pd.DataFrame({
+        'date': np.repeat(dates.date, tickers),
+        'ticker': np.tile(symbols, len(dates)),
+        'close_price': prices.ravel().round(4)
+    })
+    return market, shares
+
+def composition_inputs(market: pd.DataFrame, shares: pd.Series):
+    """The market cap and price frames the index builder loads from DuckDB"""
+    frame = pd.DataFrame({
+        'Date': pd.to_datetime(market['date']),
+        'Ticker': market['ticker'],
+        'Price': market['close_price']
+    })
+    frame['MarketCap'] = np.trunc(frame['Price'] * frame['Ticker'].map(shares)).astype('int64')
+    return frame[['Date', 'Ticker', 'MarketCap']], frame[['Date', 'Ticker', 'Price']]
+
+# =============================================
+# Timing
+# =============================================
+def timed(results: list, stage: str, fn, repeat: int = 3, rows: int = None, setup=None):
+    """Run `fn` `repeat` times (after `setup`, untimed, if given), record the timings and return
+    the last result"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    entry = {
+        'stage': stage,
+        'repeat': repeat,
+        'median_seconds': round(statistics.median(timings), 6),
+        'min_seconds': round(min(timings), 6)
+    }
+    if rows is not None:
+        entry['rows'] = rows
+        entry['rows_per_second'] = round(rows / statistics.median(timings), 1) if statistics.median(timings) else None
+    results.append(entry)
+    print(f"    {stage:<40} {entry['median_seconds'] * 1000:10.1f} ms")
+    return result
+
+# =============================================
+# Stages
+# =============================================
+def bench_pipeline(results, market, shares, workdir, repeat):
+    # DuckDB insert into a fresh schema each time
+    db_path = os.path.join(workdir, 'bench.duckdb')
+    conn = duckdb.connect(db_path)
+    create_database_schema(conn)
+
+    def reset_market_data():
+        conn.execute("DELETE FROM market_data")
+    timed(results, 'insert_market_data', lambda: insert_market_data(conn, market),
+          repeat, rows=len(market), setup=reset_market_data)
+
+    # The fetcher's bulk loader: companies, share counts and prices in one transaction
+    loader = []
+
+    def fill_loader():
+        for table in ('market_data', 'shares_outstanding', 'companies'):
+            conn.execute(f"DELETE FROM {table}")
+        loader[:] = [BulkLoader(conn, batch_size=len(shares) + 1)]
+        for ticker, group in market.groupby('ticker', sort=False):
+            loader[0].add(ticker, ticker, pd.Series(group['close_price'].to_numpy(),
+                                                    index=pd.to_datetime(group['date'])), int(shares[ticker]))
+    timed(results, 'BulkLoader.flush', lambda: loader[0].flush(), repeat, rows=len(market), setup=fill_loader)
+    conn.close()
+
+    market_caps, prices = composition_inputs(market, shares)
+    top = timed(results, 'get_daily_top_100', lambda: composition.get_daily_top_100(market_caps),
+                repeat, rows=len(market_caps))
+    # The default ranking path: QUALIFY over the market_caps view of the loaded database
+    composition.DB_PATH = db_path
+    first_date, last_date = market['date'].min(), market['date'].max()
+    timed(results, 'get_daily_top_100_from_db',
+          lambda: composition.get_daily_top_100_from_db(first_date, last_date), repeat, rows=len(market))
+    top = composition.calculate_weights(top)
+    changes = timed(results, 'track_composition_changes', lambda: composition.track_composition_changes(top),
+                    repeat, rows=len(top))
+    performance = timed(results, 'calculate_index_performance',
+                        lambda: composition.calculate_index_performance(top, prices), repeat, rows=len(top))
+    schemes = get_schemes(list(WEIGHTING_SCHEMES))
+    timed(results, 'calculate_variant_performance', lambda: composition.calculate_variant_performance(top, prices, schemes),
+          repeat, rows=len(top) * len(schemes))
+
+    pdf_path = os.path.join(workdir, 'bench.pdf')
+    timed(results, 'create_pdf (performance)', lambda: create_pdf(performance, "Index Performance", pdf_path),
+          max(1, repeat // 3), rows=len(performance))
+    timed(results, 'create_pdf (changes)', lambda: create_pdf(changes, "Composition Changes", pdf_path),
+          max(1, repeat // 3), rows=len(changes))
+    return top, changes, performance
+
+def bench_dashboard(results, top, changes, performance, workdir, repeat):
+    """Time the dashboard's server callbacks in-process, through the Flask test client, with
+    inputs that miss the figure cache"""
+    import interactive_dashboard as dashboard
+    from dashboard_data import DashboardData
+
+    data_dir = os.path.join(workdir, 'outputs')
+    os.makedirs(data_dir, exist_ok=True)
+    write_table(top[['Date', 'Ticker', 'MarketCap', 'Weight']], data_dir, COMPOSITION, 'parquet')
+    write_table(changes, data_dir, CHANGES, 'parquet')
+    write_table(performance, data_dir, PERFORMANCE, 'parquet')
+    dashboard.data = DashboardData(data_dir)
+    client = dashboard.app.server.test_client()
+
+    dates = performance['Date'].dt.strftime('%Y-%m-%d').tolist()
+    tickers = sorted(top['Ticker'].unique())
+    rng = random.Random(0)
+
+    def post(body):
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"Callback failed with HTTP {response.status_code}")
+        return len(response.data)
+
+    timed(results, 'dashboard: first page load', lambda: client.get('/_dash-layout').data, 1)
+
+    def chart():
+        start, end = sorted(rng.sample(range(len(dates)), 2))
+        return post(callback_body(
+            [('performance-chart', 'figure')],
+            [('performance-chart', 'relayoutData', {'xaxis.range[0]': dates[start], 'xaxis.range[1]': dates[end]})],
+            'performance-chart.relayoutData'))
+    timed(results, 'dashboard: update_performance_chart', chart, repeat)
+
+    def composition_chart():
+        return post(callback_body(
+            [('composition-chart', 'figure')], [('date-picker', 'date', rng.choice(dates))], 'date-picker.date'))
+    timed(results, 'dashboard: update_composition', composition_chart, repeat)
+
+    def composition_table():
+        return post(callback_body(
+            [('composition-table', 'data'), ('composition-table', 'page_count'),
+             ('composition-table', 'page_current')],
+            [('date-picker', 'date', rng.choice(dates)),
+             ('composition-table', 'page_current', rng.randrange(10)),
+             ('composition-table', 'page_size', 10),
+             ('composition-table', 'sort_by', [{'column_id': 'Ticker', 'direction': 'asc'}]),
+             ('composition-table', 'filter_query', '')],
+            'composition-table.page_current'))
+    timed(results, 'dashboard: update_composition_table', composition_table, repeat)
+
+    def changes_table():
+        return post(callback_body(
+            [('changes-table', 'data'), ('changes-table', 'page_count'), ('changes-table', 'page_current')],
+            [('changes-ticker', 'value', rng.choice(tickers)),
+             ('changes-table', 'page_current', 0),
+             ('changes-table', 'page_size', 10),
+             ('changes-table', 'sort_by', []),
+             ('changes-table', 'filter_query', '')],
+            'changes-ticker.value'))
+    timed(results, 'dashboard: update_changes_table', changes_table, repeat)
+
+# =============================================
+# Comparison
+# =============================================
+def compare(results: list, baseline_path: str, threshold: float) -> int:
+    """Print each stage's change against a previous run; returns the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = {entry['stage']: entry for entry in json.load(f)['results']}
+    regressions = 0
+    print(f"\n    Compared with {baseline_path}:")
+    for entry in results:
+        previous = baseline.get(entry['stage'])
+        if not previous or not previous['median_seconds']:
+            continue
+        ratio = entry['median_seconds'] / previous['median_seconds']
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"    {entry['stage']:<40} {ratio:6.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic market data.')
+    parser.add_argument('--tickers', type=int, default=150, help='Number of synthetic tickers')
+    parser.add_argument('--years', type=float, default=3, help='Years of business days')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic market')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (the median is reported)')
+    parser.add_argument('--skip-dashboard', action='store_true', help='Skip the dashboard callback stages')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='Previous results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Slowdown ratio reported as a regression with --compare')
+    args = parser.parse_args()
+
+    market, shares = synthetic_market(args.tickers, args.years, args.seed)
+    print(f"Synthetic market: {args.tickers} tickers x {market['date'].nunique()} days ({len(market):,} rows)")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        top, changes, performance = bench_pipeline(results, market, shares, workdir, args.repeat)
+        if not args.skip_dashboard:
+            bench_dashboard(results, top, changes, performance, workdir, args.repeat)
+
+    report = {
+        'meta': {
+            'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'tickers': args.tickers,
+            'years': args.years,
+            'seed': args.seed,
+            'rows': len(market),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'versions': {'numpy': np.__version__, 'pandas': pd.__version__, 'duckdb': duckdb.__version__}
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -513,20 +513,134 @@ CREATE_SCHEMA_SQL = """
         date DATE,
         ticker VARCHAR(10),
         close_price DOUBLE PRECISION,
-        market_cap BIGINT,
         PRIMARY KEY (date, ticker)
     );
+
+    -- One row per change in share count; a count applies from effective_date until the next one
+    CREATE TABLE IF NOT EXISTS shares_outstanding (
+        ticker VARCHAR(10),
+        effective_date DATE,
+        shares BIGINT,
+        PRIMARY KEY (ticker, effective_date)
+    );
+
+    -- Market cap as of each trading day. A ticker's earliest share count also covers the
+    -- history before it was first recorded.
+    CREATE OR REPLACE VIEW market_caps AS
+    WITH share_periods AS (
+        SELECT ticker,
+               CASE WHEN ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY effective_date) = 1
+                    THEN DATE '0001-01-01' ELSE effective_date END AS effective_date,
+               shares
+        FROM shares_outstanding
+    )
+    SELECT m.date, m.ticker, m.close_price,
+           CAST(TRUNC(m.close_price * s.shares) AS BIGINT) AS market_cap
+    FROM market_data m
+    ASOF JOIN share_periods s
+      ON m.ticker = s.ticker AND m.date >= s.effective_date;
 """
 
-INSERT_COMPANY_DATA_SQL = """
+INSERT_COMPANY_BATCH_SQL = """
     INSERT OR IGNORE INTO companies 
-    VALUES (?, ?);
+    SELECT ticker, company_name 
+    FROM companies_batch;
 """
 
 INSERT_MARKET_DATA_SQL = """
-    INSERT OR IGNORE INTO market_data 
-    SELECT date, ticker, close_price, market_cap 
+    INSERT OR IGNORE INTO market_data (date, ticker, close_price) 
+    SELECT date, ticker, close_price 
     FROM temp_df;
 """
 
-No_of_companies=100
\ No newline at end of file
+# Only share counts that differ from the latest stored one are written
+INSERT_SHARES_BATCH_SQL = """
+    INSERT OR IGNORE INTO shares_outstanding 
+    SELECT b.ticker, b.effective_date, b.shares 
+    FROM shares_batch b 
+    LEFT JOIN (
+        SELECT ticker, arg_max(shares, effective_date) AS shares 
+        FROM shares_outstanding 
+        GROUP BY ticker
+    ) latest ON latest.ticker = b.ticker 
+    WHERE latest.shares IS DISTINCT FROM b.shares;
+"""
+
+# Databases created before shares_outstanding stored market_cap in market_data, computed from
+# one share count per ticker. That count is recovered once for tickers with no share rows yet,
+# so the market_caps view covers the old history too.
+LEGACY_MARKET_CAP_COLUMN_SQL = """
+    SELECT COUNT(*) 
+    FROM information_schema.columns 
+    WHERE table_name = 'market_data' AND column_name = 'market_cap';
+"""
+
+MIGRATE_LEGACY_SHARES_SQL = """
+    INSERT OR IGNORE INTO shares_outstanding 
+    SELECT ticker, MIN(date), CAST(ROUND(arg_max(market_cap / close_price, date)) AS BIGINT) 
+    FROM market_data 
+    WHERE market_cap IS NOT NULL AND close_price > 0 
+      AND ticker NOT IN (SELECT ticker FROM shares_outstanding) 
+    GROUP BY ticker;
+"""
+
+MARKET_DATA_WATERMARKS_SQL = """
+    SELECT ticker, MAX(date) 
+    FROM market_data 
+    GROUP BY ticker;
+"""
+
+# Index builder state, so each run only processes dates after the last one it published
+CREATE_INDEX_STATE_SQL = """
+    CREATE TABLE IF NOT EXISTS index_state (
+        id INTEGER PRIMARY KEY,
+        last_date DATE,
+        index_level DOUBLE PRECISION
+    );
+
+    CREATE TABLE IF NOT EXISTS index_constituents (
+        ticker VARCHAR(10) PRIMARY KEY,
+        market_cap BIGINT,
+        weight DOUBLE PRECISION
+    );
+
+    CREATE TABLE IF NOT EXISTS index_last_prices (
+        ticker VARCHAR(10) PRIMARY KEY,
+        close_price DOUBLE PRECISION
+    );
+
+    CREATE TABLE IF NOT EXISTS index_composition (
+        date DATE,
+        ticker VARCHAR(10),
+        market_cap BIGINT,
+        weight DOUBLE PRECISION,
+        PRIMARY KEY (date, ticker)
+    );
+
+    CREATE TABLE IF NOT EXISTS index_composition_changes (
+        date DATE PRIMARY KEY,
+        additions INTEGER,
+        removals INTEGER,
+        added_tickers TEXT,
+        removed_tickers TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS index_performance (
+        date DATE PRIMARY KEY,
+        daily_return DOUBLE PRECISION,
+        cumulative_value DOUBLE PRECISION
+    );
+
+    CREATE TABLE IF NOT EXISTS index_variant_performance (
+        date DATE,
+        variant VARCHAR,
+        daily_return DOUBLE PRECISION,
+        cumulative_value DOUBLE PRECISION,
+        PRIMARY KEY (date, variant)
+    );
+"""
+
+No_of_companies=100
+SP500_TICKERS=get_sp500_tickers
+
+DB_PATH=r"PATH_TO_DATABASE\market_cap_data_new_3.duckdb"  # Update path
@@ -0,0 +1,399 @@
+import os
+import time
+import threading
+import duckdb
+import numpy as np
+import pandas as pd
+from index_outputs import COMPOSITION, CHANGES, PERFORMANCE, VARIANTS, current_version
+
+# =============================================
+# Data Sources
+# =============================================
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _table_source(directory: str, name: str):
+    """Return a DuckDB table expression for an output table and the path it reads"""
+    dataset_dir = os.path.join(directory, name)
+    parquet_path = os.path.join(directory, f"{name}.parquet")
+    csv_path = os.path.join(directory, f"{name}.csv")
+    if os.path.isdir(dataset_dir):
+        # Read the version the dataset's pointer names, which stays in place until the next publish
+        version = current_version(dataset_dir)
+        files_dir = os.path.join(dataset_dir, version) if version else dataset_dir
+        pattern = _sql_string(os.path.join(files_dir, "**", "*.parquet"))
+        # An empty version has no year= directory, hence no year column to exclude
+        return (f"(SELECT COLUMNS(c -> c <> 'year') FROM read_parquet({pattern}, hive_partitioning = true))",
+                dataset_dir)
+    if os.path.exists(parquet_path):
+        return f"read_parquet({_sql_string(parquet_path)})", parquet_path
+    return f"read_csv_auto({_sql_string(csv_path)})", csv_path
+
+def _latest_mtime(path: str) -> float:
+    """Newest modification time of a file, or of anything inside a directory"""
+    if not os.path.exists(path):
+        return 0.0
+    latest = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            for entry in dirs + files:
+                latest = max(latest, os.path.getmtime(os.path.join(root, entry)))
+    return latest
+
+# =============================================
+# Date Indexes
+# =============================================
+class DateIndex:
+    """A date-sorted frame with O(1) lookup of each date's rows"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.frame = df.reset_index(drop=True)
+        dates, starts = np.unique(self.frame['Date'].to_numpy(), return_index=True)
+        ends = np.append(starts[1:], len(self.frame))
+        self._rows = {pd.Timestamp(date): (start, end) for date, start, end in zip(dates, starts, ends)}
+
+    def on(self, date) -> pd.DataFrame:
+        """Rows for one date (empty if the date has none, or is None)"""
+        if date is None:
+            return self.frame.iloc[0:0]
+        start, end = self._rows.get(pd.Timestamp(date).normalize(), (0, 0))
+        return self.frame.iloc[start:end]
+
+# =============================================
+# Downsampling
+# =============================================
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps from a series.
+
+    The first and last points are always kept; each bucket in between contributes the point
+    forming the largest triangle with the previously kept point and the next bucket's mean,
+    which preserves peaks and troughs that plain striding would drop.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    kept = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x, mean_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[kept] - mean_x) * (y[start:end] - y[kept])
+                      - (x[kept] - x[start:end]) * (mean_y - y[kept]))
+        kept = start + int(np.argmax(area))
+        keep[i + 1] = kept
+    return keep
+
+def _thin_dates(dates: np.ndarray, max_count: int) -> np.ndarray:
+    """At most one date per equal-width time bin, so markers stay bounded at any zoom"""
+    if len(dates) <= max_count:
+        return dates
+    ns = dates.astype('datetime64[ns]').astype(np.int64)
+    width = max(1, (ns[-1] - ns[0]) // max_count + 1)
+    _, first = np.unique((ns - ns[0]) // width, return_index=True)
+    return dates[first]
+
+# =============================================
+# Table Paging
+# =============================================
+# DataTable filter operators, longest spellings first so '>=' isn't read as '>'
+_FILTER_OPERATORS = [('ge ', '>='), ('le ', '<='), ('lt ', '<'), ('gt ', '>'), ('ne ', '!='), ('eq ', '='),
+                     ('contains ',), ('datestartswith ',)]
+
+def _split_filter_part(part: str):
+    """Split one DataTable filter expression into (column, operator, value)"""
+    for operator_type in _FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in part:
+                name_part, value_part = part.split(operator, 1)
+                column = name_part[name_part.find('{') + 1:name_part.rfind('}')]
+                value = value_part.strip()
+                if len(value) > 1 and value[0] == value[-1] and value[0] in ('"', "'", '`'):
+                    value = value[1:-1].replace('\\' + value[0], value[0])
+                return column, operator_type[0].strip(), value
+    return None, None, None
+
+def filter_mask(frame: pd.DataFrame, filter_query: str) -> np.ndarray:
+    """Boolean row mask for a DataTable `filter_query`; unknown columns and unparsable values are ignored"""
+    mask = np.ones(len(frame), dtype=bool)
+    for part in (filter_query or '').split(' && '):
+        column, operator, value = _split_filter_part(part)
+        if column not in frame.columns or value == '':
+            continue
+        series = frame[column]
+        if operator == 'contains':
+            mask &= series.astype(str).str.contains(value, case=False, regex=False).to_numpy()
+        elif operator == 'datestartswith':
+            mask &= series.astype(str).str.startswith(value).to_numpy()
+        else:
+            try:
+                if pd.api.types.is_datetime64_any_dtype(series):
+                    value = pd.Timestamp(value)
+                elif pd.api.types.is_numeric_dtype(series):
+                    value = float(value)
+            except ValueError:
+                continue
+            mask &= getattr(series, operator)(value).to_numpy()
+    return mask
+
+def sort_order(frame: pd.DataFrame, sort_by) -> np.ndarray:
+    """Row positions of a frame in DataTable `sort_by` order (stable, so ties keep frame order)"""
+    if not sort_by:
+        return np.arange(len(frame))
+    ordered = frame.reset_index(drop=True).sort_values(
+        [column['column_id'] for column in sort_by],
+        ascending=[column['direction'] == 'asc' for column in sort_by], kind='stable')
+    return ordered.index.to_numpy()
+
+def page_rows(frame: pd.DataFrame, order: np.ndarray, mask: np.ndarray, page_current: int, page_size: int):
+    """One page of the rows in `order` that pass `mask`, plus the total page count"""
+    rows = order[mask[order]]
+    page_count = max(1, -(-len(rows) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    return frame.iloc[rows[page_current * page_size:(page_current + 1) * page_size]], page_count
+
+def _sort_key(sort_by) -> tuple:
+    return tuple((column['column_id'], column['direction']) for column in sort_by or ())
+
+# =============================================
+# Snapshots
+# =============================================
+class _Snapshot:
+    """One published version of the outputs, queried through an in-memory DuckDB connection.
+
+    The files are read in place through views, so the dashboard never holds a lock on the
+    database the index builder writes to.
+    """
+
+    def __init__(self, directory: str, version: float):
+        self.directory = directory
+        self.version = version
+        self._cache = {}
+        self._connect()
+
+    def _connect(self):
+        self._conn = duckdb.connect(':memory:')
+        for view_name, name in (('performance', PERFORMANCE), ('composition', COMPOSITION), ('changes', CHANGES)):
+            expression, _ = _table_source(self.directory, name)
+            self._conn.execute(f"CREATE VIEW {view_name} AS SELECT * FROM {expression}")
+        # Weighting variants are optional; the index builder only writes them when asked to
+        expression, path = _table_source(self.directory, VARIANTS)
+        self.has_variants = os.path.exists(path)
+        if self.has_variants:
+            self._conn.execute(f"CREATE VIEW variants AS SELECT * FROM {expression}")
+        self._local = threading.local()
+        self._cache_lock = threading.RLock()
+
+    def reopen(self):
+        """Open a fresh connection, keeping the cached values (for use in a forked child)"""
+        self._connect()
+
+    def cursor(self):
+        """The calling thread's own cursor on this snapshot"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conn.cursor()
+        return cursor
+
+    def query(self, sql: str, params=None) -> pd.DataFrame:
+        return self.cursor().execute(sql, params or []).fetchdf()
+
+    def cached(self, key, build):
+        """Compute a per-version value once and share it across threads"""
+        with self._cache_lock:
+            if key not in self._cache:
+                self._cache[key] = build()
+            return self._cache[key]
+
+# =============================================
+# Data Access Layer
+# =============================================
+class DashboardData:
+    """Lazy, hot-reloading access to the index builder's outputs.
+
+    Nothing is read until the first query. The output files' modification times are checked
+    at most every `check_interval` seconds, and a change opens a new snapshot with an empty
+    cache. Every table is published complete, so a query never sees a half-written file, but
+    the tables are published one at a time and the views read them lazily: a request made
+    while the index builder is publishing can combine tables from two runs.
+    """
+
+    def __init__(self, directory: str, check_interval: float = 5.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _source_paths(self):
+        return [_table_source(self.directory, name)[1] for name in (PERFORMANCE, COMPOSITION, CHANGES, VARIANTS)]
+
+    def snapshot(self) -> _Snapshot:
+        """The current snapshot, reloading first if the outputs changed since it was opened"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._checked_at >= self.check_interval:
+                version = max(_latest_mtime(path) for path in self._source_paths())
+                if self._snapshot is None or version != self._snapshot.version:
+                    self._snapshot = _Snapshot(self.directory, version)
+                self._checked_at = time.monotonic()
+            return self._snapshot
+
+    @property
+    def version(self) -> float:
+        return self.snapshot().version
+
+    def preload(self):
+        """Build everything the dashboard reads up front, e.g. in a server's master process before
+        forking workers, which then share the loaded pages copy-on-write"""
+        self.date_range()
+        self.summary_arrays()
+        self.changes_page()
+        self.performance_window()
+        self.composition_on(self.date_range()[1])
+
+    def after_fork(self):
+        """Give a forked worker its own locks and DuckDB connection; DuckDB connections must not
+        be shared across processes"""
+        self._lock = threading.Lock()
+        if self._snapshot is not None:
+            self._snapshot.reopen()
+
+    def performance(self) -> pd.DataFrame:
+        """Daily index return and cumulative value, sorted by date"""
+        snapshot = self.snapshot()
+        return snapshot.cached('performance', lambda: self._with_dates(
+            # Casts keep the types when a header-only CSV (an empty table) is read as text
+            snapshot.query("""
+                SELECT Date, CAST(Daily_Return AS DOUBLE) AS Daily_Return,
+                       CAST(Cumulative_Value AS DOUBLE) AS Cumulative_Value
+                FROM performance ORDER BY Date
+            """)))
+
+    def variants(self) -> pd.DataFrame:
+        """Weighting-variant performance, sorted by variant and date (empty when none were published)"""
+        snapshot = self.snapshot()
+        if not snapshot.has_variants:
+            return pd.DataFrame(columns=['Date', 'Variant', 'Daily_Return', 'Cumulative_Value'])
+        return snapshot.cached('variants', lambda: self._with_dates(snapshot.query(
+            """
+            SELECT Date, Variant, CAST(Daily_Return AS DOUBLE) AS Daily_Return,
+                   CAST(Cumulative_Value AS DOUBLE) AS Cumulative_Value
+            FROM variants ORDER BY Variant, Date
+            """)))
+
+    def changes(self) -> pd.DataFrame:
+        """Composition change log, sorted by date"""
+        snapshot = self.snapshot()
+        return snapshot.cached('changes', lambda: self._with_dates(
+            snapshot.query("SELECT * FROM changes ORDER BY Date")))
+
+    def date_range(self):
+        """First and last dates with a published composition"""
+        snapshot = self.snapshot()
+        return snapshot.cached('date_range', lambda: tuple(
+            pd.Timestamp(d) for d in snapshot.cursor().execute(
+                "SELECT MIN(CAST(Date AS DATE)), MAX(CAST(Date AS DATE)) FROM composition").fetchone()))
+
+    def performance_window(self, start=None, end=None, max_points: int = 1000) -> pd.DataFrame:
+        """Performance between two dates (inclusive, open-ended when None), LTTB-downsampled
+        to at most `max_points` rows"""
+        performance = self.performance()
+        dates = performance['Date'].to_numpy()
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right')
+        window = performance.iloc[lo:hi]
+        keep = lttb(window['Date'].to_numpy().astype('datetime64[ns]').astype(np.int64).astype(float),
+                    window['Cumulative_Value'].to_numpy(dtype=float), max_points)
+        return window.iloc[keep]
+
+    def variants_window(self, start=None, end=None, max_points: int = 1000) -> dict:
+        """{variant: its performance between two dates}, each LTTB-downsampled like `performance_window`"""
+        windows = {}
+        for name, variant in self.variants().groupby('Variant', sort=False):
+            dates = variant['Date'].to_numpy()
+            lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left')
+            hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right')
+            window = variant.iloc[lo:hi]
+            keep = lttb(window['Date'].to_numpy().astype('datetime64[ns]').astype(np.int64).astype(float),
+                        window['Cumulative_Value'].to_numpy(dtype=float), max_points)
+            windows[name] = window.iloc[keep]
+        return windows
+
+    def change_dates(self, start=None, end=None, max_count: int = 500) -> np.ndarray:
+        """Composition change dates between two dates, thinned to at most `max_count`"""
+        dates = self.changes()['Date'].to_numpy()
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right')
+        return _thin_dates(dates[lo:hi], max_count)
+
+    def changes_page(self, page_current: int = 0, page_size: int = 10, sort_by=None, filter_query: str = '',
+                     ticker: str = None):
+        """One page of the change log (newest first unless sorted) and the page count.
+
+        `ticker` limits the log to dates the ticker was added or removed, looked up through an
+        inverted index; sort orders are computed once per version and reused across pages.
+        """
+        snapshot = self.snapshot()
+        changes = self.changes()
+        sort_by = sort_by or [{'column_id': 'Date', 'direction': 'desc'}]
+        order = snapshot.cached(('changes_order', _sort_key(sort_by)), lambda: sort_order(changes, sort_by))
+        mask = filter_mask(changes, filter_query)
+        if ticker and ticker.strip():
+            by_ticker = snapshot.cached('changes_by_ticker', lambda: self._index_change_tickers(changes))
+            ticker_mask = np.zeros(len(changes), dtype=bool)
+            ticker_mask[by_ticker.get(ticker.strip().upper(), [])] = True
+            mask &= ticker_mask
+        return page_rows(changes, order, mask, page_current, page_size)
+
+    def composition_page(self, date, page_current: int = 0, page_size: int = 10, sort_by=None,
+                         filter_query: str = ''):
+        """One page of a date's constituents (largest market cap first unless sorted) and the page count"""
+        constituents = self.composition_on(date)
+        return page_rows(constituents, sort_order(constituents, sort_by),
+                         filter_mask(constituents, filter_query), page_current, page_size)
+
+    @staticmethod
+    def _index_change_tickers(changes: pd.DataFrame) -> dict:
+        """{ticker: positions of the change-log rows that add or remove it}"""
+        positions = {}
+        for column in ('Added_Tickers', 'Removed_Tickers'):
+            for row, tickers in enumerate(changes[column].fillna('')):
+                for ticker in tickers.split(', '):
+                    if ticker:
+                        positions.setdefault(ticker, []).append(row)
+        return {ticker: sorted(rows) for ticker, rows in positions.items()}
+
+    def summary_arrays(self) -> dict:
+        """Columnar date -> (cumulative value, daily return) arrays and the change count, compact
+        enough to ship to the browser once per page load"""
+        snapshot = self.snapshot()
+
+        def build():
+            performance = self.performance()
+            return {
+                'dates': performance['Date'].dt.strftime('%Y-%m-%d').tolist(),
+                'cumulative': performance['Cumulative_Value'].round(6).tolist(),
+                'daily': performance['Daily_Return'].round(8).tolist(),
+                'changes': len(self.changes())
+            }
+        return snapshot.cached('summary_arrays', build)
+
+    def composition_on(self, date) -> pd.DataFrame:
+        """Constituents on one date, largest market cap first"""
+        snapshot = self.snapshot()
+        return snapshot.cached('composition_index', lambda: DateIndex(self._with_dates(snapshot.query("""
+            SELECT Date, Ticker, CAST(MarketCap AS BIGINT) AS MarketCap, CAST(Weight AS DOUBLE) AS Weight
+            FROM composition
+            ORDER BY Date, MarketCap DESC
+        """)))).on(date)
+
+    @staticmethod
+    def _with_dates(df: pd.DataFrame) -> pd.DataFrame:
+        if 'Date' in df.columns:
+            df['Date'] = pd.to_datetime(df['Date'])
+        return df
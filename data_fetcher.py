@@ -1,59 +1,107 @@
 import duckdb
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import logging
 import sys
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from constants import CREATE_SCHEMA_SQL, INSERT_COMPANY_DATA_SQL, INSERT_MARKET_DATA_SQL, SP500_TICKERS ,DB_PATH
+from constant import CREATE_SCHEMA_SQL, INSERT_COMPANY_BATCH_SQL, INSERT_MARKET_DATA_SQL, INSERT_SHARES_BATCH_SQL, LEGACY_MARKET_CAP_COLUMN_SQL, MIGRATE_LEGACY_SHARES_SQL, MARKET_DATA_WATERMARKS_SQL, SP500_TICKERS ,DB_PATH
+from price_sources import PriceSource, RecordingPriceSource, make_price_source
+from rate_limit import TokenBucket, AdaptiveConcurrencyLimit, RequestController, is_retryable
+from instrumentation import metrics
 
 # Configure logging to display messages in the terminal only
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 handler = logging.StreamHandler()
 handler.setFormatter(logging.Formatter('%(message)s'))  # Only show raw messages
-logger.addHandler(handler)
+for name in (__name__, 'price_sources', 'rate_limit'):
+    logging.getLogger(name).setLevel(logging.INFO)
+    logging.getLogger(name).addHandler(handler)
 
-def fetch_ticker_data(ticker: str, start_date: datetime, end_date: datetime) -> tuple:
-    """Fetches historical market data and calculates market capitalization."""
+def _request(controller: RequestController, fn, *args, cost: int = 1):
+    """Sends a provider request through the controller when there is one, recording its latency
+    (retries and rate-limit waits included) in the fetch latency histogram. `cost` is how many
+    provider requests the call makes."""
+    start = time.perf_counter()
     try:
-        stock = yf.Ticker(ticker)
-        # Retrieve historical closing prices
-        hist = stock.history(start=start_date, end=end_date, interval="1d")["Close"]
-        shares_outstanding = stock.info.get("sharesOutstanding", None)
-        company_name = stock.info.get("longName", ticker)
-        
-        # Custom error for missing shares data
-        if not shares_outstanding:
-            logger.error(f"MISSING DATA ERROR: No shares outstanding data for {ticker}")
-            return ticker, company_name, pd.Series(dtype='float64'), pd.Series(dtype='float64')
-        
-        # Calculate market capitalization directly
-        market_caps = (hist * shares_outstanding).astype("int64")
-        
-        return ticker, company_name, hist, market_caps
+        return controller.call(fn, *args, cost=cost) if controller is not None else fn(*args)
+    finally:
+        metrics.observe('fetch_request_seconds', time.perf_counter() - start, call=fn.__name__)
+
+def fetch_tickers(source: PriceSource, tickers: list, start_date: datetime, end_date: datetime,
+                  controller: RequestController = None, failed: list = None) -> list:
+    """Fetches historical closing prices and current shares outstanding for a group of tickers.
+
+    Returns one (ticker, company_name, hist, shares_outstanding) tuple per ticker; tickers
+    without usable data come back with an empty Series and no share count. Tickers whose
+    requests failed with a retryable error (after the controller's retries) are also appended
+    to `failed` for another pass.
+    """
+    failed = failed if failed is not None else []
+    history_start = time.perf_counter()
+    try:
+        # Yahoo sends one price request per ticker even inside a batched download
+        history = _request(controller, source.fetch_history, tickers, start_date, end_date, cost=len(tickers))
     except Exception as e:
-        logger.error(f"FETCH ERROR: {ticker} - {str(e)}")
-        return ticker, ticker, pd.Series(dtype='float64'), pd.Series(dtype='float64')
+        logger.error(f"FETCH ERROR: {', '.join(tickers)} - {str(e)}")
+        if is_retryable(e):
+            failed.extend(tickers)
+        return [(t, t, pd.Series(dtype='float64'), None) for t in tickers]
+
+    # A batched price request's latency is shared evenly by its tickers
+    history_share = (time.perf_counter() - history_start) / len(tickers)
+
+    results = []
+    for ticker in tickers:
+        ticker_start = time.perf_counter()
+        if ticker not in history:
+            logger.error(f"FETCH ERROR: {ticker} - No price data returned")
+            failed.append(ticker)
+            results.append((ticker, ticker, pd.Series(dtype='float64'), None))
+            continue
+        hist = history[ticker]
+        if hist.empty:
+            # Nothing new for this range (e.g. a weekend); the company details aren't needed
+            results.append((ticker, ticker, hist, None))
+            continue
+        try:
+            info = _request(controller, source.fetch_info, ticker)
+            shares_outstanding = info.get("sharesOutstanding", None)
+            company_name = info.get("longName", ticker)
+
+            # Custom error for missing shares data
+            if not shares_outstanding:
+                logger.error(f"MISSING DATA ERROR: No shares outstanding data for {ticker}")
+                results.append((ticker, company_name, pd.Series(dtype='float64'), None))
+                continue
+
+            # Market cap is derived at query time from the market_caps view
+            results.append((ticker, company_name, hist, int(shares_outstanding)))
+            metrics.observe('fetch_ticker_seconds', history_share + time.perf_counter() - ticker_start)
+        except Exception as e:
+            logger.error(f"FETCH ERROR: {ticker} - {str(e)}")
+            if is_retryable(e):
+                failed.append(ticker)
+            results.append((ticker, ticker, pd.Series(dtype='float64'), None))
+    return results
 
 def create_database_schema(conn):
     """Creates the necessary database schema in DuckDB."""
     try:
         conn.execute(CREATE_SCHEMA_SQL)
+        if conn.execute(LEGACY_MARKET_CAP_COLUMN_SQL).fetchone()[0]:
+            seeded = conn.execute(MIGRATE_LEGACY_SHARES_SQL).fetchone()[0]
+            if seeded:
+                logger.info(f"Seeded shares outstanding for {seeded} tickers from the legacy market_cap column")
         logger.info("Schema created successfully")
     except Exception as e:
         logger.error(f"SCHEMA CREATION ERROR: {str(e)}")
 
-def insert_company_data(conn, ticker: str, company_name: str):
-    """Inserts company data into the companies table, ignoring duplicates."""
-    try:
-        conn.execute(INSERT_COMPANY_DATA_SQL, [ticker, company_name])
-    except Exception as e:
-        logger.error(f"DB INSERT ERROR: Company data for {ticker} - {str(e)}")
-
 def insert_market_data(conn, df: pd.DataFrame):
     """Inserts market data into the market_data table using a temporary DataFrame."""
     try:
@@ -62,16 +110,188 @@ def insert_market_data(conn, df: pd.DataFrame):
     except Exception as e:
         logger.error(f"DB INSERT ERROR: Market data - {str(e)}")
 
+class BulkLoader:
+    """Accumulates fetched tickers and writes them to DuckDB in one transaction per batch.
+
+    Share counts are recorded as of `effective_date` (today by default) and only when they
+    differ from the latest stored count.
+    """
+
+    def __init__(self, conn, batch_size: int = 100, effective_date=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.effective_date = effective_date or datetime.today().date()
+        self.rows_loaded = 0
+        self.tickers_loaded = 0
+        self.transactions = 0
+        self.write_seconds = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._companies = []
+        self._dates, self._tickers, self._prices = [], [], []
+
+    def add(self, ticker: str, company_name: str, hist: pd.Series, shares_outstanding: int):
+        """Queues one ticker's history, flushing once batch_size tickers are pending."""
+        self._companies.append((ticker, company_name, shares_outstanding))
+        self._dates.append(pd.DatetimeIndex(hist.index).date)
+        self._tickers.append(np.full(len(hist), ticker, dtype=object))
+        self._prices.append(hist.to_numpy(dtype='float64'))
+        if len(self._companies) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Inserts the pending companies, share counts and market data in a single transaction."""
+        if not self._companies:
+            return
+        companies_df = pd.DataFrame(self._companies, columns=['ticker', 'company_name', 'shares'])
+        companies_df['effective_date'] = self.effective_date
+        market_df = pd.DataFrame({
+            'date': np.concatenate(self._dates),
+            'ticker': np.concatenate(self._tickers),
+            'close_price': np.concatenate(self._prices)
+        })
+        write_start = time.perf_counter()
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            self.conn.register('companies_batch', companies_df)
+            self.conn.execute(INSERT_COMPANY_BATCH_SQL)
+            self.conn.register('shares_batch', companies_df)
+            self.conn.execute(INSERT_SHARES_BATCH_SQL)
+            self.conn.register('temp_df', market_df)
+            self.conn.execute(INSERT_MARKET_DATA_SQL)
+            self.conn.execute("COMMIT")
+            self.rows_loaded += len(market_df)
+            self.tickers_loaded += len(companies_df)
+            self.transactions += 1
+        except Exception as e:
+            self.conn.execute("ROLLBACK")
+            logger.error(f"DB INSERT ERROR: Batch of {len(companies_df)} tickers - {str(e)}")
+        finally:
+            for view_name in ('companies_batch', 'shares_batch', 'temp_df'):
+                self.conn.unregister(view_name)
+            self.write_seconds += time.perf_counter() - write_start
+            self._reset()
+
+    def rows_per_second(self) -> float:
+        """Insert throughput over all flushed batches."""
+        return self.rows_loaded / self.write_seconds if self.write_seconds else 0.0
+
+# Marks the end of the fetch results on the writer queue
+_END_OF_RESULTS = object()
+
+def fetch_worker(source: PriceSource, tickers: list, start_date, end_date, results: queue.Queue,
+                 controller: RequestController = None, failed: list = None):
+    """Fetches one chunk of tickers and hands usable results to the writer.
+
+    Blocks on the bounded queue while the writer is behind, which throttles fetching.
+    """
+    for ticker, company_name, hist, shares_outstanding in fetch_tickers(source, tickers, start_date, end_date,
+                                                                        controller, failed):
+        if not hist.empty and shares_outstanding:
+            results.put((ticker, company_name, hist, shares_outstanding))
+
+def writer_loop(loader: BulkLoader, results: queue.Queue):
+    """Drains fetched results into the bulk loader until the end-of-results marker arrives."""
+    while True:
+        item = results.get()
+        if item is _END_OF_RESULTS:
+            break
+        try:
+            loader.add(*item)
+        except Exception as e:
+            logger.error(f"DB INSERT ERROR: {item[0]} - {str(e)}")
+    loader.flush()
+
+def run_fetch_pipeline(source: PriceSource, chunks: list, end_date, loader: BulkLoader,
+                       controller: RequestController = None, workers: int = 5, queue_size: int = 200) -> list:
+    """Runs fetch workers against a single DuckDB writer thread through a bounded queue.
+
+    `chunks` is a list of (tickers, start_date) pairs. Only the writer thread touches the
+    loader's connection while the pipeline runs. With a controller, the pool is sized to the
+    controller's maximum concurrency and the controller decides how many requests are in
+    flight. Returns the tickers whose requests failed.
+    """
+    if controller is not None:
+        workers = max(workers, controller.limit.maximum)
+    failed = []
+    results = queue.Queue(maxsize=queue_size)
+    writer = threading.Thread(target=writer_loop, args=(loader, results), name="duckdb-writer")
+    writer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch_worker, source, chunk, chunk_start, end_date, results,
+                                       controller, failed)
+                       for chunk, chunk_start in chunks]
+            for future in futures:
+                future.result()
+    finally:
+        results.put(_END_OF_RESULTS)
+        writer.join()
+    return failed
+
+def get_ticker_watermarks(conn) -> dict:
+    """Returns the latest stored date for every ticker in market_data."""
+    try:
+        return {ticker: pd.Timestamp(max_date) for ticker, max_date in conn.execute(MARKET_DATA_WATERMARKS_SQL).fetchall()}
+    except Exception as e:
+        logger.error(f"DB READ ERROR: Market data watermarks - {str(e)}")
+        return {}
+
+def plan_fetch_ranges(tickers: list, watermarks: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """Groups tickers by the date their fetch should start from.
+
+    Tickers already in the database resume the day after their high-water mark; tickers
+    without history are backfilled from start_date. Tickers that are up to date, or whose
+    remaining range has no business days (e.g. only a weekend), are dropped.
+    """
+    ranges = {}
+    for ticker in tickers:
+        last_date = watermarks.get(ticker)
+        ticker_start = start_date if last_date is None else max(start_date, last_date + pd.DateOffset(days=1))
+        if ticker_start < end_date:
+            ranges.setdefault(ticker_start, []).append(ticker)
+    # end_date is exclusive
+    return {group_start: group for group_start, group in ranges.items()
+            if len(pd.bdate_range(group_start, end_date - pd.Timedelta(days=1)))}
+
 def main():
     """Main function that initializes the database, fetches data, and stores it."""
-    conn = duckdb.connect(DB_PATH)
-    # conn = duckdb.connect(':memory:')  # In memory
-
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description='Fetch S&P 500 market data.')
     parser.add_argument('--start-date', required=True, help='Start date in YYYYMMDD format')
     parser.add_argument('--end-date', required=True, help='End date in YYYYMMDD format')
+    parser.add_argument('--db-path', default=DB_PATH, help='DuckDB database file (":memory:" for in-memory)')
+    parser.add_argument('--source', default='yahoo-batch', choices=['yahoo', 'yahoo-batch', 'fixture'],
+                        help='Where prices come from: per-ticker Yahoo requests, batched Yahoo downloads, '
+                             'or a recorded fixture')
+    parser.add_argument('--fixture-dir', help='Directory of recorded prices/companies CSV or Parquet files')
+    parser.add_argument('--chunk-size', type=int, help='Tickers per price request')
+    parser.add_argument('--record-fixture', help='Save everything fetched to this directory for offline replay')
+    parser.add_argument('--record-format', default='csv', choices=['csv', 'parquet'])
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch dates after each ticker\'s latest stored date; '
+                             'tickers with no history are backfilled from --start-date')
+    parser.add_argument('--batch-size', type=int, default=100, help='Tickers per insert transaction')
+    parser.add_argument('--workers', type=int, default=5, help='Initial number of concurrent provider requests')
+    parser.add_argument('--max-workers', type=int, default=20,
+                        help='Upper bound for the adaptive request concurrency')
+    parser.add_argument('--rate-limit', type=float,
+                        help='Provider requests per second (default: the price source\'s own limit, 0 for none)')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per request, with exponential backoff')
+    parser.add_argument('--latency-target', type=float,
+                        help='Seconds per request above which concurrency is reduced as if the request failed')
+    parser.add_argument('--retry-passes', type=int, default=1,
+                        help='Extra passes over tickers that still failed at the end of the run')
+    parser.add_argument('--queue-size', type=int,
+                        help='Fetched tickers allowed to wait for the writer before fetchers block '
+                             '(default: twice --batch-size)')
+    parser.add_argument('--metrics-file', help='Append per-stage timings as JSON lines to this file')
+    parser.add_argument('--metrics-prom', help='Write stage totals and latency histograms in Prometheus text format')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record each stage\'s peak Python allocations with tracemalloc (slower)')
     args = parser.parse_args()
+    metrics.configure(args.metrics_file, args.trace_memory)
 
     # Sanitize input by removing dashes if present
     args.start_date = args.start_date.replace("-", "")
@@ -89,6 +309,23 @@ def main():
         logger.error("DATE ORDER ERROR: Start date must be before end date.")
         sys.exit(1)
 
+    try:
+        source = make_price_source(args.source, args.chunk_size, args.fixture_dir)
+    except (ValueError, FileNotFoundError) as e:
+        logger.error(f"PRICE SOURCE ERROR: {e}")
+        sys.exit(1)
+    if args.record_fixture:
+        source = RecordingPriceSource(source)
+
+    rate_limit = args.rate_limit if args.rate_limit is not None else source.default_rate_limit
+    controller = RequestController(
+        bucket=TokenBucket(rate_limit) if rate_limit else None,
+        limit=AdaptiveConcurrencyLimit(initial=args.workers, maximum=max(args.workers, args.max_workers),
+                                       latency_target=args.latency_target),
+        retries=args.retries
+    )
+
+    conn = duckdb.connect(args.db_path)
     try:
         create_database_schema(conn)
         
@@ -96,27 +333,67 @@ def main():
         start_date = pd.Timestamp(start_date_input)
         end_date = pd.Timestamp(end_date_input) + pd.DateOffset(days=1)
         
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(fetch_ticker_data, t, start_date, end_date) 
-                       for t in SP500_TICKERS]
-            
-            for future in as_completed(futures):
-                ticker, company_name, hist, market_caps = future.result()
-                if not hist.empty and not market_caps.empty:
-                    insert_company_data(conn, ticker, company_name)
-                    
-                    df = pd.DataFrame({
-                        'date': hist.index.date,
-                        'ticker': ticker,
-                        'close_price': hist.values,
-                        'market_cap': market_caps.values
-                    })
-                    insert_market_data(conn, df)
-
-        logger.info(f"\nData successfully saved to {DB_PATH}")
+        tickers = list(SP500_TICKERS)
+        with metrics.span('plan_fetch') as span:
+            watermarks = get_ticker_watermarks(conn) if args.incremental else {}
+            fetch_ranges = plan_fetch_ranges(tickers, watermarks, start_date, end_date)
+            span.rows = sum(len(group) for group in fetch_ranges.values())
+        if args.incremental:
+            pending = sum(len(group) for group in fetch_ranges.values())
+            logger.info(f"Incremental fetch: {pending} tickers behind, {len(tickers) - pending} up to date")
+
+        chunks = [(group[i:i + source.chunk_size], group_start)
+                  for group_start, group in fetch_ranges.items()
+                  for i in range(0, len(group), source.chunk_size)]
+        fetch_start = time.perf_counter()
+        loader = BulkLoader(conn, batch_size=args.batch_size)
+
+        queue_size = args.queue_size or 2 * args.batch_size
+        with metrics.span('fetch_pipeline') as span:
+            failed = run_fetch_pipeline(source, chunks, end_date, loader, controller, queue_size=queue_size)
+            span.rows = loader.rows_loaded
+
+        # Retry queue: tickers that failed even after per-request retries get another pass
+        ticker_starts = {ticker: chunk_start for chunk, chunk_start in chunks for ticker in chunk}
+        for retry_pass in range(1, args.retry_passes + 1):
+            if not failed:
+                break
+            logger.info(f"Retry pass {retry_pass}: {len(failed)} tickers")
+            retry_ranges = {}
+            for ticker in failed:
+                retry_ranges.setdefault(ticker_starts[ticker], []).append(ticker)
+            retry_chunks = [(group[i:i + source.chunk_size], group_start)
+                            for group_start, group in retry_ranges.items()
+                            for i in range(0, len(group), source.chunk_size)]
+            rows_before = loader.rows_loaded
+            with metrics.span('fetch_retry_pipeline', retry_pass=retry_pass) as span:
+                failed = run_fetch_pipeline(source, retry_chunks, end_date, loader, controller, queue_size=queue_size)
+                span.rows = loader.rows_loaded - rows_before
+        if failed:
+            logger.error(f"FETCH FAILED: {len(failed)} tickers could not be fetched - {', '.join(sorted(failed))}")
+
+        elapsed = time.perf_counter() - fetch_start
+        logger.info(f"Loaded {loader.rows_loaded} rows for {loader.tickers_loaded}/{len(tickers)} tickers in {elapsed:.2f}s "
+                    f"({loader.rows_loaded / elapsed if elapsed else 0:.0f} rows/sec, {len(chunks)} price requests)")
+        logger.info(f"Inserted in {loader.transactions} transactions taking {loader.write_seconds:.2f}s "
+                    f"({loader.rows_per_second():.0f} rows/sec)")
+        # Inserts run on the writer thread, overlapping the fetch; report their total on its own
+        metrics.record('insert_market_data', loader.write_seconds, loader.rows_loaded)
+
+        if args.record_fixture:
+            with metrics.span('record_fixture'):
+                source.save(args.record_fixture, args.record_format)
+
+        logger.info(f"\nData successfully saved to {args.db_path}")
     
     finally:
         conn.close()
+        for stage in metrics.stage_summary():
+            logger.info(f"  {stage['stage']:<22} {stage['seconds']:8.2f}s  {stage['rows']:>10} rows")
+        if args.metrics_prom:
+            with open(args.metrics_prom, 'w') as f:
+                f.write(metrics.prometheus_text())
+        metrics.close()
 
 if __name__ == "__main__":
     main()
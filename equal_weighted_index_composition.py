@@ -1,22 +1,34 @@
+import os
+import sys
+import argparse
 import duckdb
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from constant import No_of_companies
+from constant import CREATE_INDEX_STATE_SQL, No_of_companies
+from index_outputs import COMPOSITION, CHANGES, PERFORMANCE, VARIANTS, TableWriter, empty_table, write_table
+from index_reports import PdfReport, build_reports, monthly_changes, monthly_performance
+from instrumentation import metrics
+from weighting import WEIGHT_CAP, get_schemes
 
 # =============================================
 # Configuration
 # =============================================
 DB_PATH = r"PATH_TO_DATABASE\market_cap_data_new_3.duckdb"  # Update path
 OUTPUT_PATH = r"PATH_TO\New folder"  # Update output directory
+START_DATE = '2025-01-01'
+END_DATE = '2025-02-01'
+RANK_IN_DATABASE = True  # Select the daily top companies inside DuckDB instead of pandas
+INCREMENTAL = True  # Resume from the index state stored in DuckDB instead of rebuilding from START_DATE
+WEIGHTINGS = ()  # Extra weighting variants to compute alongside the index, e.g. ('cap', 'capped_cap', 'sqrt_cap')
 
 # =============================================
 # Database Operations
 # =============================================
-def get_market_cap_data():
+def get_market_cap_data(start_date=START_DATE, end_date=END_DATE):
     """Fetch market cap and price data from DuckDB"""
     conn = duckdb.connect(DB_PATH)
     query = """
@@ -24,28 +36,76 @@ def get_market_cap_data():
                ticker AS Ticker,
                market_cap AS MarketCap,
                close_price AS Price
-        FROM market_data
-        WHERE date BETWEEN '2025-01-01' AND '2025-02-01'
+        FROM market_caps
+        WHERE date BETWEEN ? AND ?
     """
-    df = conn.execute(query).fetchdf()
+    df = fetch_typed(conn, query, [start_date, end_date])
     conn.close()
     
-    # Clean data
-    df['MarketCap'] = pd.to_numeric(df['MarketCap'].replace('[\$,]', '', regex=True), errors='coerce')
-    df['Price'] = pd.to_numeric(df['Price'].replace('[\$,]', '', regex=True), errors='coerce')
+    return df.dropna()
+
+def get_daily_top_100_from_db(start_date=START_DATE, end_date=END_DATE):
+    """Fetch only the top 100 stocks by market cap each day, ranked inside DuckDB"""
+    conn = duckdb.connect(DB_PATH)
+    query = """
+        SELECT date AS Date, 
+               ticker AS Ticker,
+               market_cap AS MarketCap,
+               close_price AS Price
+        FROM market_caps
+        WHERE date BETWEEN ? AND ?
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY date ORDER BY market_cap DESC, ticker) <= ?
+        ORDER BY date, market_cap DESC
+    """
+    df = fetch_typed(conn, query, [start_date, end_date, No_of_companies])
+    conn.close()
     
-    df['Date'] = pd.to_datetime(df['Date'])
+    return df.dropna()
+
+def get_price_data(tickers, start_date=START_DATE, end_date=END_DATE):
+    """Fetch closing prices for the given tickers from DuckDB"""
+    conn = duckdb.connect(DB_PATH)
+    conn.register('index_tickers', pd.DataFrame({'ticker': list(tickers)}))
+    query = """
+        SELECT date AS Date, 
+               ticker AS Ticker,
+               close_price AS Price
+        FROM market_data
+        WHERE date BETWEEN ? AND ?
+          AND ticker IN (SELECT ticker FROM index_tickers)
+    """
+    df = fetch_typed(conn, query, [start_date, end_date])
+    conn.close()
     
     return df.dropna()
 
+def fetch_typed(conn, query, params):
+    """Run a query and load the result through Arrow, keeping DuckDB's column types
+    
+    Numeric columns stay BIGINT/DOUBLE, dates become datetime64 and tickers are
+    dictionary-encoded into a pandas categorical with alphabetical categories.
+    """
+    table = conn.execute(query, params).arrow()
+    if isinstance(table, pa.RecordBatchReader):
+        table = table.read_all()
+    if 'Ticker' in table.column_names:
+        i = table.column_names.index('Ticker')
+        table = table.set_column(i, 'Ticker', table.column(i).dictionary_encode())
+    df = table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
+    if 'Ticker' in df.columns:
+        # Keep category order alphabetical so sorting by code sorts by ticker
+        df['Ticker'] = df['Ticker'].cat.reorder_categories(sorted(df['Ticker'].cat.categories))
+    return df
+
 # =============================================
 # Index Construction Logic
 # =============================================
 def get_daily_top_100(df):
     """Identify top 100 stocks by market cap each day"""
     return (
-        df.groupby("Date", group_keys=False)
-        .apply(lambda x: x.nlargest(No_of_companies, "MarketCap"))
+        df.sort_values(["Date", "MarketCap"], ascending=[True, False], kind="stable")
+        .groupby("Date")
+        .head(No_of_companies)
         .reset_index(drop=True)
     )
 
@@ -54,118 +114,559 @@ def calculate_weights(df):
     df['Weight'] = 1 / No_of_companies
     return df
 
+def matrix_axes(df):
+    """Sorted unique dates and tickers of a long frame, plus each row's position on both axes"""
+    date_idx, dates = pd.factorize(df['Date'], sort=True)
+    ticker_idx, tickers = pd.factorize(df['Ticker'], sort=True)
+    return dates.to_numpy(), np.asarray(tickers, dtype=object), date_idx, ticker_idx
+
+def build_membership_matrix(df):
+    """Build a boolean dates x tickers matrix marking each day's constituents"""
+    dates, tickers, date_idx, ticker_idx = matrix_axes(df)
+    membership = np.zeros((len(dates), len(tickers)), dtype=bool)
+    membership[date_idx, ticker_idx] = True
+    return dates, tickers, membership
+
 def track_composition_changes(df):
     """Identify days with changes in index composition"""
-    df = df.sort_values('Date')
+    dates, tickers, membership = build_membership_matrix(df)
+    
+    # A ticker changed membership wherever consecutive rows differ
+    changed = membership[1:] ^ membership[:-1]
+    added = changed & membership[1:]
+    removed = changed & membership[:-1]
+    
+    # Only days with a change are turned back into ticker strings
     changes = []
-    prev_constituents = set()
+    for i in np.flatnonzero(changed.any(axis=1)):
+        added_tickers = tickers[added[i]]
+        removed_tickers = tickers[removed[i]]
+        changes.append({
+            'Date': pd.Timestamp(dates[i + 1]),
+            'Additions': len(added_tickers),
+            'Removals': len(removed_tickers),
+            'Added_Tickers': ', '.join(added_tickers),
+            'Removed_Tickers': ', '.join(removed_tickers)
+        })
     
-    for date, group in df.groupby('Date'):
-        current_constituents = set(group['Ticker'])
-        
-        if prev_constituents:
-            added = current_constituents - prev_constituents
-            removed = prev_constituents - current_constituents
-            if added or removed:
-                changes.append({
-                    'Date': date,
-                    'Additions': len(added),
-                    'Removals': len(removed),
-                    'Added_Tickers': ', '.join(added),
-                    'Removed_Tickers': ', '.join(removed)
-                })
-                
-        prev_constituents = current_constituents
-    
-    return pd.DataFrame(changes)
-
-def calculate_index_performance(df):
-    """Calculate index returns and cumulative performance"""
-    # Calculate stock returns
-    df['Stock_Return'] = df.groupby('Ticker')['Price'].pct_change()
-    
-    # Calculate daily index returns
-    index_df = df.groupby('Date').apply(
-        lambda x: (x['Stock_Return'] * x['Weight']).sum()
-    ).reset_index(name='Daily_Return')
+    # Keep the columns when there are no changes, so an empty log is still a valid table
+    return pd.DataFrame(changes, columns=['Date', 'Additions', 'Removals', 'Added_Tickers', 'Removed_Tickers'])
+
+def build_price_matrix(prices, dates, tickers):
+    """Pivot closing prices into a dense dates x tickers float array (NaN where missing)"""
+    matrix = np.full((len(dates), len(tickers)), np.nan)
+    date_idx = pd.Index(dates).get_indexer(prices['Date'])
+    ticker_idx = pd.Index(tickers).get_indexer(prices['Ticker'])
+    known = (date_idx >= 0) & (ticker_idx >= 0)
+    matrix[date_idx[known], ticker_idx[known]] = prices['Price'].to_numpy(dtype='float64')[known]
+    return matrix
+
+@dataclass
+class IndexMatrices:
+    """Dense dates x tickers views of the constituents, shared by the index and its weighting variants"""
+    dates: np.ndarray
+    tickers: np.ndarray
+    members: np.ndarray        # True where a ticker is a constituent that day
+    market_caps: np.ndarray    # constituents' market caps (0 elsewhere)
+    weights: np.ndarray        # constituents' Weight column (0 elsewhere)
+    stock_returns: np.ndarray  # each stock's return from one day to the next (one row fewer than dates)
+
+def build_index_matrices(df, prices=None):
+    """Build the shared matrices from constituent rows and `prices` (defaults to the rows in `df`)"""
+    if prices is None:
+        prices = df
+    dates, tickers, date_idx, ticker_idx = matrix_axes(df)
+    shape = (len(dates), len(tickers))
+    members = np.zeros(shape, dtype=bool)
+    members[date_idx, ticker_idx] = True
+    market_caps = np.zeros(shape)
+    market_caps[date_idx, ticker_idx] = df['MarketCap'].to_numpy(dtype='float64')
+    weights = np.zeros(shape)
+    weights[date_idx, ticker_idx] = df['Weight'].to_numpy(dtype='float64')
+    price_matrix = build_price_matrix(prices, dates, tickers)
+    
+    # Stock returns between consecutive trading days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stock_returns = price_matrix[1:] / price_matrix[:-1] - 1
+    stock_returns = np.nan_to_num(stock_returns, nan=0.0, posinf=0.0, neginf=0.0)
+    return IndexMatrices(dates, tickers, members, market_caps, weights, stock_returns)
+
+def weighted_daily_returns(weights, stock_returns):
+    """Daily index returns: yesterday's weights times today's stock returns (0 on the first day)"""
+    daily_returns = np.zeros(len(weights))
+    daily_returns[1:] = np.einsum('ij,ij->i', weights[:-1], stock_returns)
+    return daily_returns
+
+def calculate_index_performance(df, prices=None, matrices=None):
+    """Calculate index returns and cumulative performance
+    
+    Each day's return applies the previous day's weights to every stock's return over that
+    day, taken from `prices` (all closing prices; defaults to the constituent rows in `df`).
+    Stocks leaving the index therefore still count on the day they drop out.
+    """
+    if matrices is None:
+        matrices = build_index_matrices(df, prices)
+    daily_returns = weighted_daily_returns(matrices.weights, matrices.stock_returns)
+    
+    index_df = pd.DataFrame({'Date': pd.to_datetime(matrices.dates), 'Daily_Return': daily_returns})
     
     # Calculate cumulative performance
     index_df['Cumulative_Value'] = (1 + index_df['Daily_Return']).cumprod()
     
     return index_df
 
+def calculate_variant_performance(df, prices=None, schemes=None, matrices=None):
+    """Performance of the same daily constituents under each weighting scheme in `schemes`
+    ({name: function}, see weighting.py), as one tidy Date/Variant/Daily_Return/Cumulative_Value frame"""
+    if not schemes:
+        return pd.DataFrame(columns=['Date', 'Variant', 'Daily_Return', 'Cumulative_Value'])
+    if matrices is None:
+        matrices = build_index_matrices(df, prices)
+    dates = pd.to_datetime(matrices.dates)
+    variants = pd.concat([
+        pd.DataFrame({
+            'Date': dates,
+            'Variant': name,
+            'Daily_Return': weighted_daily_returns(scheme(matrices.market_caps, matrices.members),
+                                                   matrices.stock_returns)
+        })
+        for name, scheme in schemes.items()
+    ], ignore_index=True)
+    variants['Cumulative_Value'] = (1 + variants['Daily_Return']).groupby(variants['Variant']).cumprod()
+    return variants
+
+def load_constituents(start_date, end_date, carry_tickers=()):
+    """Load weighted constituents and the closing prices needed to value them
+    
+    `carry_tickers` are the previous day's constituents when continuing from a saved state;
+    their prices are loaded too so stocks dropping out on the first new day still count.
+    """
+    if RANK_IN_DATABASE:
+        with metrics.span('get_daily_top_100', ranking='duckdb') as span:
+            top_100 = get_daily_top_100_from_db(start_date, end_date)
+            span.rows = len(top_100)
+        tickers = set(top_100['Ticker']) | set(carry_tickers)
+        if not tickers:
+            # No market data in this window and nothing carried over
+            return calculate_weights(top_100), pd.DataFrame(columns=['Date', 'Ticker', 'Price'])
+        with metrics.span('get_price_data') as span:
+            prices = get_price_data(sorted(tickers), start_date, end_date)
+            span.rows = len(prices)
+    else:
+        with metrics.span('get_market_cap_data') as span:
+            raw_data = get_market_cap_data(start_date, end_date)
+            span.rows = len(raw_data)
+        with metrics.span('get_daily_top_100', ranking='pandas') as span:
+            top_100 = get_daily_top_100(raw_data)
+            span.rows = len(top_100)
+        prices = raw_data[['Date', 'Ticker', 'Price']]
+    return calculate_weights(top_100), prices
+
+@dataclass
+class IndexState:
+    """Everything needed to continue the index after `last_date`"""
+    last_date: pd.Timestamp
+    level: float
+    constituents: pd.DataFrame  # Date, Ticker, MarketCap, Weight on last_date
+    prices: pd.DataFrame        # Date, Ticker, Price of those constituents on last_date
+    variant_levels: dict = field(default_factory=dict)  # weighting variant -> level on last_date
+
+def advance_index(constituents, prices, state=None, schemes=None):
+    """Track changes and performance for new days, continuing from `state` when given
+    
+    Returns the composition changes, index performance and weighting-variant performance of
+    the new days only, together with the state after the last of them. The index and all
+    variants are computed from one set of shared matrices.
+    """
+    if state is not None:
+        constituents = pd.concat([state.constituents, constituents], ignore_index=True)
+        prices = pd.concat([state.prices, prices], ignore_index=True)
+    
+    with metrics.span('track_composition_changes') as span:
+        changes = track_composition_changes(constituents)
+        span.rows = len(constituents)
+    with metrics.span('build_index_matrices') as span:
+        matrices = build_index_matrices(constituents, prices)
+        span.rows = len(constituents)
+    with metrics.span('calculate_index_performance') as span:
+        performance = calculate_index_performance(constituents, prices, matrices)
+        span.rows = len(constituents)
+    with metrics.span('calculate_variant_performance') as span:
+        variants = calculate_variant_performance(constituents, prices, schemes, matrices)
+        span.rows = len(variants)
+    
+    if state is not None:
+        # The first row is the state's own day, already published by the previous run
+        performance = performance.iloc[1:].reset_index(drop=True)
+        performance['Cumulative_Value'] *= state.level
+        variants = variants[variants['Date'] > state.last_date].reset_index(drop=True)
+        variants['Cumulative_Value'] *= variants['Variant'].map(state.variant_levels).fillna(1.0)
+    
+    last_date = performance['Date'].iloc[-1]
+    last_constituents = constituents[constituents['Date'] == last_date][['Date', 'Ticker', 'MarketCap', 'Weight']]
+    last_prices = prices[(prices['Date'] == last_date) & prices['Ticker'].isin(last_constituents['Ticker'])]
+    new_state = IndexState(
+        last_date=last_date,
+        level=float(performance['Cumulative_Value'].iloc[-1]),
+        constituents=last_constituents.reset_index(drop=True),
+        prices=last_prices[['Date', 'Ticker', 'Price']].reset_index(drop=True),
+        variant_levels=variants.groupby('Variant')['Cumulative_Value'].last().to_dict()
+    )
+    return changes, performance, variants, new_state
+
+def iter_date_windows(start_date, end_date, chunk=None):
+    """Split [start_date, end_date] into consecutive calendar windows of one month, quarter or year"""
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if chunk is None:
+        yield start, end
+        return
+    freq = {'month': 'MS', 'quarter': 'QS', 'year': 'YS'}[chunk]
+    bounds = [start] + [b for b in pd.date_range(start, end, freq=freq) if b > start]
+    for i, window_start in enumerate(bounds):
+        window_end = bounds[i + 1] - timedelta(days=1) if i + 1 < len(bounds) else end
+        yield window_start, window_end
+
+def build_index(start_date, end_date, state=None, chunk=None, schemes=None):
+    """Build the index window by window, carrying the previous day's state across window boundaries
+    
+    Yields (constituents, changes, performance, variants, state) for each window with market
+    data, so only one window is held in memory at a time. `schemes` are the weighting variants
+    computed alongside the index.
+    """
+    for window_start, window_end in iter_date_windows(start_date, end_date, chunk):
+        carry_tickers = state.constituents['Ticker'] if state is not None else ()
+        constituents, prices = load_constituents(window_start.date(), window_end.date(), carry_tickers)
+        if constituents.empty:
+            continue
+        changes, performance, variants, state = advance_index(constituents, prices, state, schemes)
+        yield constituents, changes, performance, variants, state
+
 # =============================================
-# PDF Export Functions
+# Index State Persistence
 # =============================================
-def create_pdf(data, title, filename):
-    """Create a PDF from a DataFrame"""
-    pdf_path = f"{OUTPUT_PATH}\\{filename}.pdf"
-    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-    styles = getSampleStyleSheet()
-    
-    # Title
-    elements = [Paragraph(title, styles['Title']), Spacer(1, 12)]
-    
-    # Convert DataFrame to a list of lists for the table
-    table_data = [data.columns.tolist()] + data.values.tolist()
-    
-    # Create table
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    print(f"PDF created: {pdf_path}")
+def load_index_state(conn):
+    """Read the saved index state, or None if the index has never been built"""
+    conn.execute(CREATE_INDEX_STATE_SQL)
+    row = conn.execute("SELECT last_date, index_level FROM index_state WHERE id = 1").fetchone()
+    if row is None:
+        return None
+    last_date = pd.Timestamp(row[0])
+    constituents = conn.execute("""
+        SELECT ticker AS Ticker, market_cap AS MarketCap, weight AS Weight
+        FROM index_constituents
+    """).fetchdf()
+    constituents.insert(0, 'Date', last_date)
+    prices = conn.execute("""
+        SELECT ticker AS Ticker, close_price AS Price
+        FROM index_last_prices
+    """).fetchdf()
+    prices.insert(0, 'Date', last_date)
+    
+    # Only variants published through the last date can continue; others restart at 1.0
+    variant_levels = dict(conn.execute("""
+        SELECT variant, cumulative_value FROM index_variant_performance WHERE date = ?
+    """, [last_date.date()]).fetchall())
+    return IndexState(last_date, row[1], constituents, prices, variant_levels)
+
+def save_index_window(conn, constituents, changes, performance, state, variants=None):
+    """Append a processed window to the index tables and replace the saved state, atomically"""
+    composition_rows = constituents[['Date', 'Ticker', 'MarketCap', 'Weight']]
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.register('new_composition', composition_rows)
+        conn.execute("INSERT OR REPLACE INTO index_composition SELECT Date, Ticker, MarketCap, Weight FROM new_composition")
+        if not changes.empty:
+            conn.register('new_changes', changes)
+            conn.execute("""
+                INSERT OR REPLACE INTO index_composition_changes
+                SELECT Date, Additions, Removals, Added_Tickers, Removed_Tickers FROM new_changes
+            """)
+        conn.register('new_performance', performance)
+        conn.execute("INSERT OR REPLACE INTO index_performance SELECT Date, Daily_Return, Cumulative_Value FROM new_performance")
+        if variants is not None and not variants.empty:
+            conn.register('new_variants', variants)
+            conn.execute("""
+                INSERT OR REPLACE INTO index_variant_performance
+                SELECT Date, Variant, Daily_Return, Cumulative_Value FROM new_variants
+            """)
+        
+        conn.execute("INSERT OR REPLACE INTO index_state VALUES (1, ?, ?)", [state.last_date.date(), state.level])
+        conn.execute("DELETE FROM index_constituents")
+        conn.register('state_constituents', state.constituents)
+        conn.execute("INSERT INTO index_constituents SELECT Ticker, MarketCap, Weight FROM state_constituents")
+        conn.execute("DELETE FROM index_last_prices")
+        conn.register('state_prices', state.prices)
+        conn.execute("INSERT INTO index_last_prices SELECT Ticker, Price FROM state_prices")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def read_index_series(conn, start_date=START_DATE, end_date=END_DATE):
+    """Read the published composition changes and performance series between two dates"""
+    params = [pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()]
+    changes = conn.execute("""
+        SELECT date AS Date, additions AS Additions, removals AS Removals,
+               added_tickers AS Added_Tickers, removed_tickers AS Removed_Tickers
+        FROM index_composition_changes
+        WHERE date BETWEEN ? AND ?
+        ORDER BY date
+    """, params).fetchdf()
+    performance = conn.execute("""
+        SELECT date AS Date, daily_return AS Daily_Return, cumulative_value AS Cumulative_Value
+        FROM index_performance
+        WHERE date BETWEEN ? AND ?
+        ORDER BY date
+    """, params).fetchdf()
+    for df in (changes, performance):
+        df['Date'] = pd.to_datetime(df['Date'])
+    return changes, performance
+
+def read_variant_performance(conn, start_date=START_DATE, end_date=END_DATE):
+    """Read the published weighting-variant performance between two dates as a tidy frame"""
+    variants = conn.execute("""
+        SELECT date AS Date, variant AS Variant, daily_return AS Daily_Return, cumulative_value AS Cumulative_Value
+        FROM index_variant_performance
+        WHERE date BETWEEN ? AND ?
+        ORDER BY variant, date
+    """, [pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()]).fetchdf()
+    variants['Date'] = pd.to_datetime(variants['Date'])
+    return variants
+
+def iter_index_composition(conn, start_date=START_DATE, end_date=END_DATE):
+    """Stream the published daily composition between two dates in batches rather than one large frame"""
+    result = conn.execute("""
+        SELECT date AS Date, ticker AS Ticker, market_cap AS MarketCap, weight AS Weight
+        FROM index_composition
+        WHERE date BETWEEN ? AND ?
+        ORDER BY date, market_cap DESC
+    """, [pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()])
+    while True:
+        batch = result.fetch_df_chunk(8)
+        if batch.empty:
+            break
+        batch['Date'] = pd.to_datetime(batch['Date'])
+        yield batch
+
+def update_index_state(conn, start_date, end_date, chunk=None, schemes=None):
+    """Process only the dates after the saved state and publish them to DuckDB, one window at a time
+    
+    The saved history can only be extended forwards; a `start_date` before its first day is
+    reported, since those days need a --stateless rebuild.
+    """
+    state = load_index_state(conn)
+    if state is not None:
+        first_date = conn.execute("SELECT MIN(date) FROM index_performance").fetchone()[0]
+        if first_date is not None and pd.Timestamp(start_date) < pd.Timestamp(first_date):
+            print(f"Note: the saved index starts on {first_date}; earlier dates need a --stateless run")
+        start_date = state.last_date + timedelta(days=1)
+    if pd.Timestamp(start_date) > pd.Timestamp(end_date):
+        print(f"Index already up to date through {state.last_date.date()}")
+        return
+    
+    new_days = 0
+    for constituents, changes, performance, variants, state in build_index(start_date, end_date, state, chunk, schemes):
+        with metrics.span('save_index_window') as span:
+            save_index_window(conn, constituents, changes, performance, state, variants)
+            span.rows = len(constituents)
+        new_days += len(performance)
+    if new_days:
+        print(f"Index updated with {new_days} new days through {state.last_date.date()}")
+    else:
+        print(f"No new market data from {pd.Timestamp(start_date).date()}")
+
+# =============================================
+# Output Stage
+# =============================================
+OUTPUTS = ('composition', 'changes', 'performance', 'variants')
+FORMATS = ('csv', 'parquet', 'pdf')
+
+def export_composition(batches, writers):
+    """Stream composition batches to every writer, publish them, and return their paths"""
+    with metrics.span('write_composition') as span:
+        span.rows = 0
+        for batch in batches:
+            for writer in writers:
+                writer.write(batch)
+            span.rows += len(batch)
+        for writer in writers:
+            writer.close()
+    return [writer.path for writer in writers]
+
+def timed_write_table(df, directory, name, fmt, partition_by_year=False):
+    with metrics.span('write_table', table=name, format=fmt) as span:
+        span.rows = len(df)
+        return write_table(df, directory, name, fmt, partition_by_year)
+
+def timed_build_reports(reports, workers):
+    with metrics.span('create_pdf') as span:
+        span.rows = sum(len(report.data) for report in reports)
+        return build_reports(reports, workers)
+
+def submit_series_outputs(pool, changes, performance, outputs, formats, partition_by_year=False,
+                          pdf_summary=False, pdf_workers=2, variants=None):
+    """Queue the selected changes/performance/variants tables and PDFs on `pool`; returns the
+    futures, each resolving to a path or a list of paths"""
+    series = [
+        ('changes', CHANGES, changes, "Composition Changes", monthly_changes),
+        ('performance', PERFORMANCE, performance, "Index Performance", monthly_performance)
+    ]
+    if variants is not None and not variants.empty:
+        # The tidy variants table has no PDF report
+        series.append(('variants', VARIANTS, variants, None, None))
+    futures, reports = [], []
+    suffix = " (Monthly Summary)" if pdf_summary else ""
+    for output, name, frame, title, summarize in series:
+        if output not in outputs:
+            continue
+        for fmt in formats:
+            if fmt == 'pdf':
+                if title is None:
+                    continue
+                reports.append(PdfReport(frame, title + suffix, os.path.join(OUTPUT_PATH, f"{name}.pdf"),
+                                         summarize if pdf_summary else None))
+            else:
+                futures.append(pool.submit(timed_write_table, frame, OUTPUT_PATH, name, fmt, partition_by_year))
+    if reports:
+        # The reports are built in their own process pool, alongside the table writers
+        futures.append(pool.submit(timed_build_reports, reports, pdf_workers))
+    return futures
 
 # =============================================
 # Main Execution
 # =============================================
 def main():
-    # Fetch and prepare data
-    raw_data = get_market_cap_data()
-    top_100 = get_daily_top_100(raw_data)
-    constituents = calculate_weights(top_100)
-    
-    # Save daily composition
-    constituents[['Date', 'Ticker', 'MarketCap', 'Weight']].to_csv(
-        f"{OUTPUT_PATH}\\daily_composition.csv", 
-        index=False
-    )
+    global DB_PATH, OUTPUT_PATH
     
-    # Track and save composition changes
-    changes = track_composition_changes(constituents)
-    changes.to_csv(
-        f"{OUTPUT_PATH}\\composition_changes.csv", 
-        index=False
-    )
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description='Build the equal-weighted top-100 index.')
+    parser.add_argument('--start-date', default=START_DATE, help='Start date in YYYYMMDD or YYYY-MM-DD format')
+    parser.add_argument('--end-date', default=END_DATE, help='End date in YYYYMMDD or YYYY-MM-DD format')
+    parser.add_argument('--db-path', default=DB_PATH, help='DuckDB database file')
+    parser.add_argument('--output-path', default=OUTPUT_PATH, help='Directory for the generated files')
+    parser.add_argument('--chunk', choices=['month', 'quarter', 'year'],
+                        help='Process the range one calendar window at a time to bound memory')
+    parser.add_argument('--stateless', action='store_true',
+                        help='Build the whole range without reading or updating the saved index state')
+    parser.add_argument('--outputs', default=','.join(OUTPUTS),
+                        help='Comma-separated artifacts to write: composition, changes, performance, variants')
+    parser.add_argument('--formats', default='csv,pdf',
+                        help='Comma-separated formats to write: csv, parquet, pdf (PDF covers changes and performance)')
+    parser.add_argument('--partition-by-year', action='store_true',
+                        help='Write Parquet tables as year=YYYY partitioned directories')
+    parser.add_argument('--pdf-summary', action='store_true',
+                        help='Write monthly aggregates to the PDFs instead of every row (for long ranges)')
+    parser.add_argument('--pdf-workers', type=int, default=2, help='Processes building the PDFs concurrently')
+    parser.add_argument('--weightings', default=','.join(WEIGHTINGS),
+                        help='Comma-separated weighting variants to compute alongside the index: '
+                             'equal, cap, capped_cap, sqrt_cap')
+    parser.add_argument('--weight-cap', type=float, default=WEIGHT_CAP,
+                        help='Maximum constituent weight for the capped_cap variant')
+    parser.add_argument('--metrics-file', help='Append per-stage timings as JSON lines to this file')
+    parser.add_argument('--metrics-prom', help='Write stage totals in Prometheus text format to this file')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Record each stage's peak Python allocations with tracemalloc (slower)")
+    args = parser.parse_args()
+    metrics.configure(args.metrics_file, args.trace_memory)
     
-    # Calculate and save index performance
-    performance = calculate_index_performance(constituents)
-    performance.to_csv(
-        f"{OUTPUT_PATH}\\index_performance.csv", 
-        index=False
-    )
+    outputs = [o.strip() for o in args.outputs.split(',') if o.strip()]
+    unknown = set(outputs) - set(OUTPUTS)
+    if unknown or not outputs:
+        print(f"OUTPUT ERROR: Unknown outputs {', '.join(sorted(unknown)) or '(none)'}")
+        sys.exit(1)
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown or not formats:
+        print(f"FORMAT ERROR: Unsupported output formats {', '.join(sorted(unknown)) or '(none)'}")
+        sys.exit(1)
+    table_formats = [fmt for fmt in formats if fmt != 'pdf']
+    try:
+        schemes = get_schemes([w.strip() for w in args.weightings.split(',') if w.strip()], args.weight_cap)
+    except ValueError as e:
+        print(f"WEIGHTING ERROR: {e}")
+        sys.exit(1)
+    if not 0 < args.weight_cap <= 1:
+        print("WEIGHTING ERROR: --weight-cap must be in (0, 1].")
+        sys.exit(1)
+    if 'composition' in outputs and not table_formats:
+        print("Note: the daily composition has no PDF format; pass csv or parquet to write it.")
+    
+    try:
+        start_date = pd.Timestamp(args.start_date)
+        end_date = pd.Timestamp(args.end_date)
+    except ValueError as e:
+        print(f"INVALID DATE ERROR: {e}")
+        sys.exit(1)
+    if start_date > end_date:
+        print("DATE ORDER ERROR: Start date must not be after end date.")
+        sys.exit(1)
+    
+    DB_PATH = args.db_path
+    OUTPUT_PATH = args.output_path
+    composition_writers = ([TableWriter(OUTPUT_PATH, COMPOSITION, fmt, args.partition_by_year) for fmt in table_formats]
+                           if 'composition' in outputs else [])
+    
+    # Independent artifacts are written concurrently; each one is renamed into place when complete
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        if INCREMENTAL and not args.stateless:
+            conn = duckdb.connect(DB_PATH)
+            try:
+                with metrics.span('update_index_state'):
+                    update_index_state(conn, start_date, end_date, args.chunk, schemes)
+                with metrics.span('read_index_series') as span:
+                    # The state covers the whole saved history; export only the requested range
+                    changes, performance = read_index_series(conn, start_date, end_date)
+                    variants = read_variant_performance(conn, start_date, end_date)
+                    variants = variants[variants['Variant'].isin(list(schemes))].reset_index(drop=True)
+                    span.rows = len(performance) + len(variants)
+                # Only stream the composition out of DuckDB when it is one of the outputs
+                futures = ([pool.submit(export_composition, iter_index_composition(conn, start_date, end_date), composition_writers)]
+                           if composition_writers else [])
+                futures += submit_series_outputs(pool, changes, performance, outputs, formats,
+                                                 args.partition_by_year, args.pdf_summary, args.pdf_workers,
+                                                 variants)
+                generated = [future.result() for future in futures]
+            finally:
+                conn.close()
+        else:
+            changes_parts, performance_parts, variant_parts = [], [], []
+            with metrics.span('build_index') as span:
+                span.rows = 0
+                for constituents, changes, performance, variants, _ in build_index(start_date, end_date,
+                                                                                   chunk=args.chunk, schemes=schemes):
+                    # Save daily composition
+                    with metrics.span('write_composition') as write_span:
+                        for writer in composition_writers:
+                            writer.write(constituents[['Date', 'Ticker', 'MarketCap', 'Weight']])
+                        write_span.rows = len(constituents)
+                    changes_parts.append(changes)
+                    performance_parts.append(performance)
+                    variant_parts.append(variants)
+                    span.rows += len(constituents)
+            changes = pd.concat(changes_parts, ignore_index=True) if changes_parts else empty_table(CHANGES)
+            performance = pd.concat(performance_parts, ignore_index=True) if performance_parts else empty_table(PERFORMANCE)
+            variants = pd.concat(variant_parts, ignore_index=True) if variant_parts else empty_table(VARIANTS)
+            if not variants.empty:
+                variants = variants.sort_values(['Variant', 'Date'], kind='stable', ignore_index=True)
+            futures = [pool.submit(export_composition, [], composition_writers)] if composition_writers else []
+            futures += submit_series_outputs(pool, changes, performance, outputs, formats,
+                                             args.partition_by_year, args.pdf_summary, args.pdf_workers,
+                                             variants)
+            generated = [future.result() for future in futures]
+    generated = [path for result in generated for path in (result if isinstance(result, list) else [result])]
+    
+    print("\n    Files generated:")
+    for i, path in enumerate(generated, 1):
+        print(f"    {i}. {path}")
     
-    # Export to PDF
-    create_pdf(changes, "Composition Changes", "composition_changes")
-    create_pdf(performance, "Index Performance", "index_performance")
-    
-    print(f"""
-    Files generated:
-    1. {OUTPUT_PATH}\\daily_composition.csv
-    2. {OUTPUT_PATH}\\composition_changes.csv
-    3. {OUTPUT_PATH}\\index_performance.csv
-    4. {OUTPUT_PATH}\\composition_changes.pdf
-    5. {OUTPUT_PATH}\\index_performance.pdf
-    """)
+    print("\n    Stage timings:")
+    for stage in metrics.stage_summary():
+        labels = ', '.join(f"{k}={v}" for k, v in stage.items() if k not in ('stage', 'runs', 'seconds', 'rows'))
+        print(f"    {stage['stage']:<30} {stage['seconds']:8.2f}s  {stage['rows']:>10} rows  {labels}")
+    if args.metrics_prom:
+        with open(args.metrics_prom, 'w') as f:
+            f.write(metrics.prometheus_text())
+    metrics.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,156 @@
+import os
+import time
+import shutil
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# =============================================
+# Output Tables
+# =============================================
+# Files written by the index builder and read by the dashboard
+COMPOSITION = "daily_composition"
+CHANGES = "composition_changes"
+PERFORMANCE = "index_performance"
+VARIANTS = "index_variants"
+
+# Column types of each table, so a table with no rows is still written with its schema
+TABLE_COLUMNS = {
+    COMPOSITION: {'Date': 'datetime64[ns]', 'Ticker': 'string', 'MarketCap': 'int64', 'Weight': 'float64'},
+    CHANGES: {'Date': 'datetime64[ns]', 'Additions': 'int64', 'Removals': 'int64',
+              'Added_Tickers': 'string', 'Removed_Tickers': 'string'},
+    PERFORMANCE: {'Date': 'datetime64[ns]', 'Daily_Return': 'float64', 'Cumulative_Value': 'float64'},
+    VARIANTS: {'Date': 'datetime64[ns]', 'Variant': 'string', 'Daily_Return': 'float64', 'Cumulative_Value': 'float64'},
+}
+
+PARQUET_COMPRESSION = "zstd"
+
+# Pointer file naming the published version directory of a partitioned dataset
+CURRENT_VERSION = "CURRENT"
+
+def temp_path(path: str) -> str:
+    """A hidden scratch path beside `path`, renamed over it once complete so readers never see a
+    half-written file"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+def replace_path(tmp_path: str, path: str):
+    """Publish a finished file at `path`"""
+    os.replace(tmp_path, path)
+
+def current_version(path: str):
+    """The published version directory of a partitioned dataset, or None for an unversioned one"""
+    try:
+        with open(os.path.join(path, CURRENT_VERSION)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def publish_version(path: str, version: str):
+    """Point the dataset at `path` to its finished `version` directory
+    
+    Directories can't be renamed over one another atomically, so each publish is a new version
+    beside the old ones and only the pointer file is replaced. The version it supersedes is kept
+    until the next publish for readers still using it; anything older is removed.
+    """
+    previous = current_version(path)
+    pointer = os.path.join(path, CURRENT_VERSION)
+    tmp_pointer = temp_path(pointer)
+    with open(tmp_pointer, 'w') as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer)
+    if previous is None:
+        # First versioned publish: an older unversioned layout stays readable until the next one
+        return
+    for entry in os.listdir(path):
+        if entry in (CURRENT_VERSION, version, previous) or entry.startswith('.'):
+            continue
+        entry_path = os.path.join(path, entry)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path, ignore_errors=True)
+        else:
+            os.remove(entry_path)
+
+def empty_table(name: str) -> pd.DataFrame:
+    """A frame with no rows and the columns of output table `name` (none for unknown tables)"""
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in TABLE_COLUMNS.get(name, {}).items()})
+
+def _plain_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Convert a frame to Arrow with dictionary (categorical) columns decoded, so batches share one schema"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table
+
+class TableWriter:
+    """Writes one output table as CSV or compressed Parquet, a batch at a time.
+
+    With `partition_by_year`, Parquet output goes to `<name>/<version>/year=YYYY/part-NNNNN.parquet`
+    instead of a single `<name>.parquet` file, and `<name>/CURRENT` names the published version.
+    Everything is written to a temporary path and published by `close()`. A table that gets
+    no rows is still published, empty but with its columns.
+    """
+
+    def __init__(self, directory: str, name: str, fmt: str = "csv", partition_by_year: bool = False):
+        self.fmt = fmt
+        self.partition_by_year = partition_by_year and fmt == "parquet"
+        if self.partition_by_year:
+            self.path = os.path.join(directory, name)
+            self._version = f"v{time.time_ns()}"
+            self._tmp_path = os.path.join(self.path, f".{self._version}.{os.getpid()}.tmp")
+        else:
+            self.path = os.path.join(directory, f"{name}.{fmt}")
+            self._tmp_path = temp_path(self.path)
+        self._parquet_writer = None
+        self._batches = 0
+        self._empty = empty_table(name)
+
+    def write(self, df: pd.DataFrame):
+        if self._empty.columns.empty:
+            # A table without a known schema takes its columns from the first frame
+            self._empty = df.iloc[0:0]
+        if self.fmt == "csv":
+            df.to_csv(self._tmp_path, mode='w' if self._batches == 0 else 'a', header=self._batches == 0, index=False)
+        elif self.partition_by_year:
+            if df.empty:
+                return
+            for year, part in df.groupby(df['Date'].dt.year):
+                year_dir = os.path.join(self._tmp_path, f"year={year}")
+                os.makedirs(year_dir, exist_ok=True)
+                pq.write_table(_plain_arrow_table(part), os.path.join(year_dir, f"part-{self._batches:05d}.parquet"),
+                               compression=PARQUET_COMPRESSION)
+        else:
+            table = _plain_arrow_table(df)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self._tmp_path, table.schema, compression=PARQUET_COMPRESSION)
+            self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        self._batches += 1
+
+    def close(self):
+        if self.partition_by_year:
+            if not os.path.isdir(self._tmp_path):
+                # Nothing was written; publish an empty version so readers keep the table's columns
+                os.makedirs(self._tmp_path)
+                pq.write_table(_plain_arrow_table(self._empty), os.path.join(self._tmp_path, "part-00000.parquet"),
+                               compression=PARQUET_COMPRESSION)
+            os.replace(self._tmp_path, os.path.join(self.path, self._version))
+            publish_version(self.path, self._version)
+            return
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        elif self._batches == 0:
+            # Nothing was written; leave an empty table with its columns rather than a stale one
+            if self.fmt == "csv":
+                self._empty.to_csv(self._tmp_path, index=False)
+            else:
+                pq.write_table(_plain_arrow_table(self._empty), self._tmp_path, compression=PARQUET_COMPRESSION)
+        replace_path(self._tmp_path, self.path)
+
+def write_table(df: pd.DataFrame, directory: str, name: str, fmt: str = "csv", partition_by_year: bool = False) -> str:
+    """Write a whole frame as one output table and return its path"""
+    writer = TableWriter(directory, name, fmt, partition_by_year)
+    writer.write(df)
+    writer.close()
+    return writer.path
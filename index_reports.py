@@ -0,0 +1,103 @@
+import os
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+from index_outputs import temp_path, replace_path
+
+# =============================================
+# PDF Reports
+# =============================================
+# Rows per table chunk; each chunk is laid out on its own, so long histories never build one giant table
+PDF_ROWS_PER_TABLE = 500
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+@dataclass
+class PdfReport:
+    """One PDF to build: a frame, its title and path, and an optional summarizing function
+    applied (in the worker) before the frame is laid out"""
+    data: pd.DataFrame
+    title: str
+    path: str
+    summarize: callable = None
+
+def _format_cell(value):
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return value
+
+def _table_chunks(data: pd.DataFrame, rows_per_table: int):
+    """Paginated tables of at most `rows_per_table` rows, each repeating the header on every page"""
+    header = data.columns.tolist()
+    if not header:
+        return
+    for start in range(0, max(len(data), 1), rows_per_table):
+        chunk = data.iloc[start:start + rows_per_table]
+        rows = [[_format_cell(value) for value in row] for row in chunk.itertuples(index=False, name=None)]
+        table = LongTable([header] + rows, repeatRows=1)
+        table.setStyle(TABLE_STYLE)
+        yield table
+
+def create_pdf(data: pd.DataFrame, title: str, path: str, rows_per_table: int = PDF_ROWS_PER_TABLE) -> str:
+    """Create a PDF from a DataFrame and return its path"""
+    tmp_path = temp_path(path)
+    doc = SimpleDocTemplate(tmp_path, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = [Paragraph(title, styles['Title']), Spacer(1, 12)]
+    elements.extend(_table_chunks(data, rows_per_table))
+    doc.build(elements)
+    replace_path(tmp_path, path)
+    return path
+
+def build_report(report: PdfReport) -> str:
+    data = report.summarize(report.data) if report.summarize and not report.data.empty else report.data
+    return create_pdf(data, report.title, report.path)
+
+def build_reports(reports, workers: int = None) -> list:
+    """Build independent PDF reports concurrently in a process pool and return their paths"""
+    workers = min(len(reports), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [build_report(report) for report in reports]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(build_report, reports))
+
+# =============================================
+# Monthly Summaries
+# =============================================
+def monthly_performance(performance: pd.DataFrame) -> pd.DataFrame:
+    """Month-end index value, compounded monthly return and trading days per month"""
+    months = performance['Date'].dt.to_period('M')
+    grouped = performance.groupby(months)
+    summary = pd.DataFrame({
+        'Trading_Days': grouped.size(),
+        'Monthly_Return': grouped['Daily_Return'].apply(lambda r: (1 + r).prod() - 1),
+        'Month_End_Value': grouped['Cumulative_Value'].last()
+    })
+    summary.index = summary.index.astype(str)
+    return summary.rename_axis('Month').reset_index()
+
+def monthly_changes(changes: pd.DataFrame) -> pd.DataFrame:
+    """Change days, additions and removals per month"""
+    months = changes['Date'].dt.to_period('M')
+    grouped = changes.groupby(months)
+    summary = pd.DataFrame({
+        'Change_Days': grouped.size(),
+        'Additions': grouped['Additions'].sum(),
+        'Removals': grouped['Removals'].sum()
+    })
+    summary.index = summary.index.astype(str)
+    return summary.rename_axis('Month').reset_index()
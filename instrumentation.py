@@ -0,0 +1,176 @@
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# =============================================
+# Memory Readings
+# =============================================
+def peak_rss_bytes():
+    """The process's peak resident set size so far, or None where it can't be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# =============================================
+# Metrics Registry
+# =============================================
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Span:
+    """One timed stage; set `rows` inside the block to record how much it processed"""
+
+    def __init__(self, stage: str, labels: dict):
+        self.stage = stage
+        self.labels = labels
+        self.rows = None
+        self.traced_peak = 0
+
+class MetricsRegistry:
+    """Stage timings, row counts, memory readings and latency histograms.
+
+    Every finished span is written as one JSON line when a metrics file is configured, and the
+    totals and histograms can be rendered in the Prometheus text format. With `trace_memory`,
+    tracemalloc reports each span's peak Python allocation (nested spans included).
+    """
+
+    def __init__(self, prefix: str = 'us100'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._events = None
+        self._stages = {}
+        self._histograms = {}
+
+    def configure(self, jsonl_path: str = None, trace_memory: bool = False):
+        if jsonl_path:
+            self._events = open(jsonl_path, 'a', buffering=1)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def close(self):
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+    # ---- Spans ----
+    @contextmanager
+    def span(self, stage: str, histogram: str = None, **labels):
+        """Time a block as `stage`; also observe the duration into `histogram` when given"""
+        span = Span(stage, labels)
+        stack = self._local.__dict__.setdefault('stack', [])
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if stack:
+                stack[-1].traced_peak = max(stack[-1].traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            traced_peak = None
+            if tracing:
+                traced_peak = max(span.traced_peak, tracemalloc.get_traced_memory()[1])
+                if stack:
+                    stack[-1].traced_peak = max(stack[-1].traced_peak, traced_peak)
+                tracemalloc.reset_peak()
+            self.record(stage, seconds, span.rows, traced_peak, **labels)
+            if histogram:
+                self.observe(histogram, seconds, **labels)
+
+    def record(self, stage: str, seconds: float, rows: int = None, traced_peak: int = None, **labels):
+        """Add a finished stage to the totals and the JSON lines export"""
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            totals = self._stages.setdefault(key, {'runs': 0, 'seconds': 0.0, 'rows': 0})
+            totals['runs'] += 1
+            totals['seconds'] += seconds
+            totals['rows'] += rows or 0
+            if self._events is not None:
+                event = {
+                    'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                    'stage': stage,
+                    'seconds': round(seconds, 6),
+                    'rows': rows,
+                    'peak_rss_bytes': peak_rss_bytes(),
+                    **labels
+                }
+                if traced_peak is not None:
+                    event['peak_traced_bytes'] = traced_peak
+                self._events.write(json.dumps(event, default=str) + '\n')
+
+    # ---- Histograms ----
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                          'count': 0, 'sum': 0.0})
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    # ---- Exports ----
+    def stage_summary(self) -> list:
+        """Totals per stage (and labels), slowest first"""
+        with self._lock:
+            rows = [{'stage': stage, **dict(labels), **totals} for (stage, labels), totals in self._stages.items()]
+        return sorted(rows, key=lambda row: row['seconds'], reverse=True)
+
+    def prometheus_text(self) -> str:
+        """All totals and histograms in the Prometheus text exposition format"""
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+        p = self.prefix
+        lines = []
+        with self._lock:
+            stages = list(self._stages.items())
+            histograms = [(key, dict(h, counts=list(h['counts']))) for key, h in self._histograms.items()]
+        for metric, field, kind in (('stage_runs_total', 'runs', 'counter'),
+                                    ('stage_seconds_total', 'seconds', 'counter'),
+                                    ('stage_rows_total', 'rows', 'counter')):
+            lines.append(f"# TYPE {p}_{metric} {kind}")
+            for (stage, labels), totals in stages:
+                lines.append(f"{p}_{metric}{label_text((('stage', stage),) + labels)} {totals[field]}")
+        names = sorted({name for (name, _), _ in histograms})
+        for name in names:
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for (histogram_name, labels), histogram in histograms:
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram['buckets'], histogram['counts']):
+                    cumulative += count
+                    lines.append(f"{p}_{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{p}_{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{p}_{name}_sum{label_text(labels)} {histogram['sum']}")
+                lines.append(f"{p}_{name}_count{label_text(labels)} {histogram['count']}")
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines.append(f"# TYPE {p}_peak_rss_bytes gauge")
+            lines.append(f"{p}_peak_rss_bytes {rss}")
+        return '\n'.join(lines) + '\n'
+
+# Shared by every module in the process
+metrics = MetricsRegistry()
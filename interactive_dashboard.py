@@ -1,148 +1,337 @@
 import dash
 from dash import dcc, html, Input, Output, dash_table
 import plotly.express as px
+import plotly.graph_objects as go
+from dash.exceptions import PreventUpdate
+from plotly.utils import PlotlyJSONEncoder
 import pandas as pd
+import os
+import json
+import argparse
+import hashlib
 import threading
 import webbrowser
 import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, request
+from dashboard_data import DashboardData
+from instrumentation import metrics
 
-# Load data
-performance_df = pd.read_csv(r"PATH_TO\index_performance.csv")
-composition_df = pd.read_csv(r"PATH_TO\daily_composition.csv")
-changes_df = pd.read_csv(r"PATH_TO\composition_changes.csv")
+DATA_PATH = r"PATH_TO"  # Directory with the index builder's outputs
 
-# Convert dates to datetime
-performance_df['Date'] = pd.to_datetime(performance_df['Date'])
-composition_df['Date'] = pd.to_datetime(composition_df['Date'])
-changes_df['Date'] = pd.to_datetime(changes_df['Date']).dt.date
+# Data is queried lazily and reloaded when the index builder publishes new outputs
+data = DashboardData(DATA_PATH)
+
+# Callback payloads cached per (callback, inputs, data version)
+PAYLOAD_CACHE_SIZE = 256
+FIGURE_CACHE_DIR = None  # Directory shared by all dashboard workers, or None for in-process only
+
+# Upper bounds on what the performance chart sends for any visible range
+CHART_POINTS = 1000
+CHART_MARKERS = 300
+
+# Rows per page of the server-paged tables
+TABLE_PAGE_SIZE = 10
+
+CHANGES_COLUMNS = [
+    {'name': 'Date', 'id': 'Date', 'type': 'datetime'},
+    {'name': 'Additions', 'id': 'Additions', 'type': 'numeric'},
+    {'name': 'Removals', 'id': 'Removals', 'type': 'numeric'},
+    {'name': 'Added_Tickers', 'id': 'Added_Tickers', 'type': 'text'},
+    {'name': 'Removed_Tickers', 'id': 'Removed_Tickers', 'type': 'text'}
+]
+COMPOSITION_COLUMNS = [
+    {'name': 'Date', 'id': 'Date', 'type': 'datetime'},
+    {'name': 'Ticker', 'id': 'Ticker', 'type': 'text'},
+    {'name': 'MarketCap', 'id': 'MarketCap', 'type': 'numeric'},
+    {'name': 'Weight', 'id': 'Weight', 'type': 'numeric'}
+]
+
+# ======================================================================
+# Figure Cache
+# ======================================================================
+class FigureCache:
+    """Serialized callback payloads keyed by (callback, inputs, data version).
+
+    Entries live in an in-process LRU and, when `directory` is set, as JSON files every worker
+    can read, so the first request for a view builds it once for all users and workers. When
+    the data version changes, entries for other versions are dropped.
+    """
+
+    def __init__(self, max_entries: int = 256, directory: str = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _digest(value) -> str:
+        return hashlib.sha1(repr(value).encode()).hexdigest()
+
+    def _check_version(self, version):
+        """Drop everything cached for earlier data versions"""
+        if version == self._version:
+            return
+        self._entries.clear()
+        self._version = version
+        if self.directory:
+            prefix = self._digest(version)[:12]
+            for name in os.listdir(self.directory):
+                if name.endswith('.json') and not name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass  # Another worker got there first
+
+    def _path(self, key, version) -> str:
+        return os.path.join(self.directory, f"{self._digest(version)[:12]}-{self._digest(key)}.json")
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.directory:
+            try:
+                with open(self._path(key, version)) as f:
+                    payload = f.read()
+            except OSError:
+                return None
+            self._remember(key, version, payload)
+            return payload
+        return None
+
+    def put(self, key, version, payload: str):
+        if version != self._version:
+            return  # Built from data that has since been replaced
+        if self.directory:
+            # Write then rename, so other workers never read a partial file
+            path = self._path(key, version)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        self._remember(key, version, payload)
+
+    def _remember(self, key, version, payload: str):
+        with self._lock:
+            if version != self._version:
+                return  # A newer version was seen while this payload was being built
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def memoize(self, version):
+        """Decorator caching a payload builder's JSON per (builder, arguments, `version()`)"""
+        def decorator(build):
+            @wraps(build)
+            def wrapper(*args):
+                current = version()
+                key = (build.__name__, args)
+                payload = self.get(key, current)
+                if payload is None:
+                    payload = json.dumps(build(*args), cls=PlotlyJSONEncoder)
+                    self.put(key, current, payload)
+                return json.loads(payload)
+            return wrapper
+        return decorator
+
+figure_cache = FigureCache(PAYLOAD_CACHE_SIZE, FIGURE_CACHE_DIR)
 
 # Initialize Dash app
 app = dash.Dash(__name__)
 server = app.server
 
+# ======================================================================
+# Instrumentation
+# ======================================================================
+@server.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@server.after_request
+def record_callback_latency(response):
+    # Callbacks all arrive on one endpoint; the request names the outputs being updated
+    if request.path.endswith('/_dash-update-component') and 'request_start' in g:
+        body = request.get_json(silent=True) or {}
+        seconds = time.perf_counter() - g.request_start
+        # Multi-output callbacks are named '..a.prop...b.prop..'; label them by their first output
+        callback = body.get('output', 'unknown').strip('.').split('...')[0]
+        metrics.record('dashboard_callback', seconds, callback=callback, status=response.status_code)
+        metrics.observe('dashboard_callback_seconds', seconds, callback=callback)
+    return response
+
+@server.route('/metrics')
+def prometheus_metrics():
+    """Callback latency histograms for this worker, in Prometheus text format"""
+    return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
 # ======================================================================
 # Layout Configuration
 # ======================================================================
-app.layout = html.Div([
-    # Summary Metrics Strip (Top)
-    html.Div([
-        html.Div(id='summary-metrics', style={
-            'display': 'flex',
-            'justifyContent': 'space-between',
-            'gap': '8px',
-            'height': '70px',
-            'padding': '10px'
-        })
-    ], style={
-        'margin': '4px',
-        'padding': '6px',
-        'backgroundColor': '#333333',
-        'height': '90px',
-        'borderRadius': '8px'
-    }),
+def build_layout(first_date=None, last_date=None, summary=None):
+    return html.Div([
+        # Date -> (cumulative value, daily return) arrays for the client-side summary strip
+        dcc.Store(id='summary-store', data=summary),
     
-    # Upper Section (Chart + Changes Table)
-    html.Div([
-        # Performance Chart
-        html.Div(
-            dcc.Graph(id='performance-chart', style={'height': '247px'}),
-            style={'flex': 1, 'marginRight': '4px', 'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'}
-        ),
-        
-        # Composition Changes Table
+        # Summary Metrics Strip (Top)
         html.Div([
-            html.Div("Composition Changes", style={
-                'fontSize': '14px', 
-                'marginBottom': '4px',
-                'fontWeight': '600',
-                'color': 'white',
-                'height':'240',
-                'text-align': 'center'
-            }),
-            dash_table.DataTable(
-                id='changes-table',
-                style_table={
-                    'height': '220px',
-                    'overflowY': 'auto'
-                },
-                style_cell={
-                    'padding': '3px',
-                    'fontSize': '14px',
-                    'border': '1px solid #555',
-                    'backgroundColor': '#333',
-                    'color': 'white',
-                    'textAlign': 'center'
-                },
-                style_header={
-                    'backgroundColor': '#555',
-                    'fontWeight': '600',
-                    'color': 'white',
-                    'textAlign': 'center'
-                }
-            )
-        ], style={'flex': 1, 'marginLeft': '4px', 'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'})
-    ], style={'display': 'flex', 'gap': '8px', 'margin': '8px', 'height': '260px'}),
+            html.Div(id='summary-metrics', style={
+                'display': 'flex',
+                'justifyContent': 'space-between',
+                'gap': '8px',
+                'height': '70px',
+                'padding': '10px'
+            })
+        ], style={
+            'margin': '4px',
+            'padding': '6px',
+            'backgroundColor': '#333333',
+            'height': '90px',
+            'borderRadius': '8px'
+        }),
     
-    # Vertical Spacer
-    html.Div(style={'height': '8px'}),
-    
-    # Lower Section (Composition Analysis)
-    html.Div([
-        # Left Column
+        # Upper Section (Chart + Changes Table)
         html.Div([
+            # Performance Chart
+            html.Div(
+                dcc.Graph(id='performance-chart', style={'height': '247px'}),
+                style={'flex': 1, 'marginRight': '4px', 'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'}
+            ),
+        
+            # Composition Changes Table
             html.Div([
-                html.Div("Index Composition-Top 10", style={
-                    'fontSize': '15px',
+                html.Div("Composition Changes", style={
+                    'fontSize': '14px', 
                     'marginBottom': '4px',
                     'fontWeight': '600',
                     'color': 'white',
-                'text-align': 'center'
+                    'height':'240',
+                    'text-align': 'center'
                 }),
-                dcc.DatePickerSingle(
-                    id='date-picker',
-                    min_date_allowed=composition_df['Date'].min(),
-                    max_date_allowed=composition_df['Date'].max(),
-                    date=composition_df['Date'].max(),
-                    display_format='YYYY-MM-DD',
-                    style={'marginBottom': '6px'}
+                dcc.Input(
+                    id='changes-ticker',
+                    type='text',
+                    placeholder='Search ticker (e.g. NVDA)',
+                    debounce=True,
+                    style={'marginBottom': '4px', 'width': '200px'}
                 ),
-                dcc.Graph(id='composition-chart', style={'height': '240px'})
-            ], style={'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'})
-        ], style={'flex': 1, 'marginRight': '4px'}),
-        
-        # Right Column
+                dash_table.DataTable(
+                    id='changes-table',
+                    columns=CHANGES_COLUMNS,
+                    page_action='custom',
+                    page_current=0,
+                    page_size=TABLE_PAGE_SIZE,
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[],
+                    filter_action='custom',
+                    filter_query='',
+                    style_table={
+                        'height': '220px',
+                        'overflowY': 'auto'
+                    },
+                    style_cell={
+                        'padding': '3px',
+                        'fontSize': '14px',
+                        'border': '1px solid #555',
+                        'backgroundColor': '#333',
+                        'color': 'white',
+                        'textAlign': 'center'
+                    },
+                    style_header={
+                        'backgroundColor': '#555',
+                        'fontWeight': '600',
+                        'color': 'white',
+                        'textAlign': 'center'
+                    }
+                )
+            ], style={'flex': 1, 'marginLeft': '4px', 'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'})
+        ], style={'display': 'flex', 'gap': '8px', 'margin': '8px', 'height': '260px'}),
+    
+        # Vertical Spacer
+        html.Div(style={'height': '8px'}),
+    
+        # Lower Section (Composition Analysis)
         html.Div([
-            html.Div("Composition Details", style={
-                'fontSize': '14px',
-                'marginBottom': '4px',
-                'fontWeight': '600',
-                'color': 'white',
-                'text-align': 'center'
-            }),
-            dash_table.DataTable(
-                id='composition-table',
-                style_table={
-                    'height': '280px',
-                    'overflowY': 'auto'
-                },
-                style_cell={
-                    'padding': '3px',
+            # Left Column
+            html.Div([
+                html.Div([
+                    html.Div("Index Composition-Top 10", style={
+                        'fontSize': '15px',
+                        'marginBottom': '4px',
+                        'fontWeight': '600',
+                        'color': 'white',
+                    'text-align': 'center'
+                    }),
+                    dcc.DatePickerSingle(
+                        id='date-picker',
+                        min_date_allowed=first_date,
+                        max_date_allowed=last_date,
+                        date=last_date,
+                        display_format='YYYY-MM-DD',
+                        style={'marginBottom': '6px'}
+                    ),
+                    dcc.Graph(id='composition-chart', style={'height': '240px'})
+                ], style={'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'})
+            ], style={'flex': 1, 'marginRight': '4px'}),
+        
+            # Right Column
+            html.Div([
+                html.Div("Composition Details", style={
                     'fontSize': '14px',
-                    'border': '1px solid #555',
-                    'backgroundColor': '#333',
-                    'color': 'white',
-                    'textAlign': 'center'
-                },
-                style_header={
-                    'backgroundColor': '#555',
+                    'marginBottom': '4px',
                     'fontWeight': '600',
                     'color': 'white',
-                    'textAlign': 'center'
-                }
-            )
-        ], style={'flex': 1, 'marginLeft': '4px', 'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'})
-    ], style={'display': 'flex', 'gap': '8px', 'margin': '8px', 'height': '320px'})
-])
+                    'text-align': 'center'
+                }),
+                dash_table.DataTable(
+                    id='composition-table',
+                    columns=COMPOSITION_COLUMNS,
+                    page_action='custom',
+                    page_current=0,
+                    page_size=TABLE_PAGE_SIZE,
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[],
+                    filter_action='custom',
+                    filter_query='',
+                    style_table={
+                        'height': '280px',
+                        'overflowY': 'auto'
+                    },
+                    style_cell={
+                        'padding': '3px',
+                        'fontSize': '14px',
+                        'border': '1px solid #555',
+                        'backgroundColor': '#333',
+                        'color': 'white',
+                        'textAlign': 'center'
+                    },
+                    style_header={
+                        'backgroundColor': '#555',
+                        'fontWeight': '600',
+                        'color': 'white',
+                        'textAlign': 'center'
+                    }
+                )
+            ], style={'flex': 1, 'marginLeft': '4px', 'backgroundColor': '#444', 'borderRadius': '8px', 'padding': '8px'})
+        ], style={'display': 'flex', 'gap': '8px', 'margin': '8px', 'height': '320px'})
+    ])
+
+def serve_layout():
+    # Built per page load so the date picker follows the latest published data
+    return build_layout(*data.date_range(), data.summary_arrays())
+
+# Validate callbacks against a data-free copy so no data is read at import
+app.validation_layout = build_layout()
+app.layout = serve_layout
 
 # ======================================================================
 # Callbacks
@@ -151,12 +340,51 @@ app.layout = html.Div([
     Output('performance-chart', 'figure'),
     Input('performance-chart', 'relayoutData')
 )
-def update_performance_chart(_):
-    fig = px.line(performance_df, x='Date', y='Cumulative_Value', labels={'Cumulative_Value': 'Index Value'})
+def update_performance_chart(relayout_data):
+    start, end = visible_range(relayout_data)
+    return performance_figure(start, end)
+
+def visible_range(relayout_data):
+    """The x-axis range a relayout event asks for; (None, None) for the full series"""
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout_data:
+        bounds = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        bounds = relayout_data['xaxis.range']
+    else:
+        # Hover, drag-mode and y-only changes don't need new data
+        raise PreventUpdate
+    return tuple(pd.Timestamp(bound).normalize() for bound in bounds)
+
+@figure_cache.memoize(lambda: data.version)
+def performance_figure(start, end):
+    performance = data.performance_window(start, end, CHART_POINTS)
+    fig = go.Figure(go.Scattergl(
+        x=performance['Date'], y=performance['Cumulative_Value'],
+        mode='lines', name='Index Value'
+    ))
     
-    # Add vertical lines for composition changes
-    for change_date in changes_df['Date']:
-        fig.add_vline(x=change_date, line_dash="dot", line_color="red")
+    # Weighting variants published alongside the index, overlaid for comparison
+    variants = data.variants_window(start, end, CHART_POINTS)
+    for name, variant in variants.items():
+        fig.add_trace(go.Scattergl(
+            x=variant['Date'], y=variant['Cumulative_Value'],
+            mode='lines', line=dict(width=1), name=name.replace('_', ' ').title() + ' Weight'
+        ))
+    
+    # Composition changes as one trace of dotted vertical segments, not one shape per date
+    if not performance.empty:
+        values = pd.concat([performance['Cumulative_Value']] +
+                           [variant['Cumulative_Value'] for variant in variants.values()])
+        low, high = values.min(), values.max()
+        change_dates = data.change_dates(start, end, CHART_MARKERS)
+        fig.add_trace(go.Scattergl(
+            x=[x for d in change_dates for x in (d, d, None)],
+            y=[y for _ in change_dates for y in (low, high, None)],
+            mode='lines', line=dict(color='red', dash='dot', width=1),
+            hoverinfo='skip', name='Composition Change', showlegend=False
+        ))
     
     # Add gridlines
     fig.update_xaxes(showgrid=True, gridwidth=0.5, gridcolor='#555')
@@ -164,6 +392,10 @@ def update_performance_chart(_):
     
     fig.update_layout(
         hovermode="x unified",
+        showlegend=bool(variants),
+        legend=dict(orientation='h', y=1.02, x=0),
+        yaxis_title='Index Value',
+        uirevision='performance',  # keep the user's zoom when the downsampled data is swapped in
         plot_bgcolor='#222',
         paper_bgcolor='#222',
         font_color='white',
@@ -172,13 +404,23 @@ def update_performance_chart(_):
     )
     return fig
 
+def table_records(page: pd.DataFrame):
+    """DataTable rows for one page, with dates shown as YYYY-MM-DD"""
+    page = page.copy()
+    page['Date'] = page['Date'].dt.strftime('%Y-%m-%d')
+    return page.to_dict('records')
+
 @app.callback(
-    [Output('composition-chart', 'figure'),
-     Output('composition-table', 'data')],
-    [Input('date-picker', 'date')]
+    Output('composition-chart', 'figure'),
+    Input('date-picker', 'date')
 )
 def update_composition(selected_date):
-    filtered = composition_df[composition_df['Date'] == selected_date]
+    # A cleared date picker sends None; that renders an empty chart
+    return composition_figure(pd.Timestamp(selected_date).normalize() if selected_date else None)
+
+@figure_cache.memoize(lambda: data.version)
+def composition_figure(selected_date):
+    filtered = data.composition_on(selected_date)
     
     # Bar chart
     bar_fig = px.bar(filtered.nlargest(10, 'MarketCap'), 
@@ -193,66 +435,149 @@ def update_composition(selected_date):
         height=240
     )
     
-    # Table data
-    table_data = filtered.sort_values('MarketCap', ascending=False).to_dict('records')
-    
-    return bar_fig, table_data
+    return bar_fig
 
 @app.callback(
-    Output('changes-table', 'data'),
-    Input('changes-table', 'page_current')
+    [Output('composition-table', 'data'),
+     Output('composition-table', 'page_count'),
+     Output('composition-table', 'page_current')],
+    [Input('date-picker', 'date'),
+     Input('composition-table', 'page_current'),
+     Input('composition-table', 'page_size'),
+     Input('composition-table', 'sort_by'),
+     Input('composition-table', 'filter_query')]
 )
-def update_changes_table(_):
-    return changes_df.sort_values('Date', ascending=False).to_dict('records')
+def update_composition_table(selected_date, page_current, page_size, sort_by, filter_query):
+    # A new date, sort or filter starts again from the first page
+    if 'composition-table.page_current' not in dash.ctx.triggered_prop_ids:
+        page_current = 0
+    page, page_count = data.composition_page(selected_date, page_current, page_size, sort_by, filter_query)
+    return table_records(page), page_count, min(page_current, page_count - 1)
 
 @app.callback(
+    [Output('changes-table', 'data'),
+     Output('changes-table', 'page_count'),
+     Output('changes-table', 'page_current')],
+    [Input('changes-ticker', 'value'),
+     Input('changes-table', 'page_current'),
+     Input('changes-table', 'page_size'),
+     Input('changes-table', 'sort_by'),
+     Input('changes-table', 'filter_query')]
+)
+def update_changes_table(ticker, page_current, page_size, sort_by, filter_query):
+    # A new search, sort or filter starts again from the first page
+    if 'changes-table.page_current' not in dash.ctx.triggered_prop_ids:
+        page_current = 0
+    page, page_count = data.changes_page(page_current, page_size, sort_by, filter_query, ticker)
+    return table_records(page), page_count, min(page_current, page_count - 1)
+
+# Runs in the browser: looks the picked date up in the preloaded arrays (ISO dates sort
+# lexically, so a binary search finds it) and renders the strip without a server round trip
+app.clientside_callback(
+    """
+    function(selectedDate, store) {
+        if (!store) {
+            return window.dash_clientside.no_update;
+        }
+        var dates = store.dates;
+        var date = selectedDate ? selectedDate.slice(0, 10) : dates[dates.length - 1];
+        var lo = 0, hi = dates.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (dates[mid] < date) { lo = mid + 1; } else { hi = mid; }
+        }
+        var found = lo < dates.length && dates[lo] === date;
+        var cumulativeValue = found ? store.cumulative[lo] : 0;
+        var dailyReturn = found ? store.daily[lo] : 0;
+        var metrics = [
+            ['Cumulative Return', cumulativeValue.toFixed(2)],
+            ['Daily Change', (dailyReturn * 100).toFixed(2) + '%'],
+            ['Total Changes', String(store.changes)]
+        ];
+        return metrics.map(function(metric) {
+            return {
+                type: 'Div', namespace: 'dash_html_components',
+                props: {
+                    children: [
+                        {type: 'Div', namespace: 'dash_html_components', props: {
+                            children: metric[0],
+                            style: {fontSize: '17px', marginBottom: '2px', color: 'white'}}},
+                        {type: 'Div', namespace: 'dash_html_components', props: {
+                            children: metric[1],
+                            style: {fontSize: '19px', fontWeight: '600', color: 'white'}}}
+                    ],
+                    style: {border: '1px solid #555', padding: '6px', flex: 1, textAlign: 'center',
+                            backgroundColor: '#222', borderRadius: '8px'}
+                }
+            };
+        });
+    }
+    """,
     Output('summary-metrics', 'children'),
-    Input('date-picker', 'date')
+    [Input('date-picker', 'date'),
+     Input('summary-store', 'data')]
 )
-def update_summary_metrics(selected_date):
-    if selected_date is None:
-        selected_date = composition_df['Date'].max()
-    else:
-        selected_date = pd.to_datetime(selected_date)
-    
-    daily_data = performance_df[performance_df['Date'] == selected_date]
-    cumulative_value = daily_data['Cumulative_Value'].iloc[0] if not daily_data.empty else 0
-    daily_return = daily_data['Daily_Return'].iloc[0] if not daily_data.empty else 0
-    num_changes = len(changes_df)
-    selected_date_str = selected_date.strftime('%Y-%m-%d')
-    
-    metrics = [
-        ("Cumulative Return", f"{cumulative_value:.2f}"),
-        ("Daily Change", f"{daily_return*100:.2f}%"),
-        ("Total Changes", str(num_changes))
-    ]
-    
-    return [
-        html.Div(
-            [
-                html.Div(label, style={'fontSize': '17px', 'marginBottom': '2px', 'color': 'white'}),
-                html.Div(value, style={'fontSize': '19px', 'fontWeight': '600', 'color': 'white'})
-            ],
-            style={
-                'border': '1px solid #555',
-                'padding': '6px',
-                'flex': 1,
-                'textAlign': 'center',
-                'backgroundColor': '#222',
-                'borderRadius': '8px'
-            }
-        ) for label, value in metrics
-    ]
 
 # =========ii=============================================================
 # Run Server
 # ======================================================================
-def open_browser():
+def open_browser(url='http://localhost:8050/'):
     time.sleep(1)
-    webbrowser.open_new('http://localhost:8050/')
+    webbrowser.open_new(url)
+
+def serve_production(host, port, workers, threads):
+    """Run `server` under gunicorn with `workers` processes forked from this one"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("--serve needs gunicorn (pip install gunicorn; not available on Windows)")
+
+    class DashboardServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('preload_app', True)
+            self.cfg.set('post_fork', lambda arbiter, worker: data.after_fork())
+
+        def load(self):
+            return server
+
+    DashboardServer().run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the US100 index dashboard")
+    parser.add_argument("--data-path", default=DATA_PATH, help="Directory with the index builder's outputs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--serve", action="store_true",
+                        help="Run under gunicorn with several worker processes instead of the development server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes with --serve")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per worker with --serve")
+    parser.add_argument("--cache-dir", default=FIGURE_CACHE_DIR, help="Figure cache directory shared by the workers")
+    parser.add_argument("--open-browser", action=argparse.BooleanOptionalAction, default=None,
+                        help="Open the dashboard in a browser (default: on for the development server only)")
+    parser.add_argument("--debug", action="store_true", help="Enable Dash debug mode on the development server")
+    parser.add_argument("--metrics-file", help="Append each callback's latency as JSON lines to this file")
+    args = parser.parse_args()
+    metrics.configure(args.metrics_file)
+
+    global data
+    data = DashboardData(args.data_path)
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        figure_cache.directory = args.cache_dir
+
+    open_in_browser = (not args.serve) if args.open_browser is None else args.open_browser
+    if open_in_browser:
+        threading.Thread(target=open_browser, args=(f"http://localhost:{args.port}/",), daemon=True).start()
+
+    if args.serve:
+        # Load before forking so the workers share the data pages copy-on-write
+        data.preload()
+        serve_production(args.host, args.port, args.workers, args.threads)
+    else:
+        app.run(host=args.host, port=args.port, debug=args.debug, use_reloader=False)
 
 if __name__ == '__main__':
-    threading.Thread(target=app.run_server, kwargs={'debug': True, 'use_reloader': False}).start()
-    open_browser()
-    while True:
-        time.sleep(1)
+    main()
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import threading
+import urllib.request
+import numpy as np
+from dashboard_data import DashboardData
+
+# =============================================
+# Requests
+# =============================================
+def callback_body(outputs, inputs, changed):
+    """A `/_dash-update-component` request like the one the browser sends"""
+    output_ids = [f"{component}.{prop}" for component, prop in outputs]
+    return {
+        'output': output_ids[0] if len(output_ids) == 1 else '..' + '...'.join(output_ids) + '..',
+        'outputs': [{'id': component, 'property': prop} for component, prop in outputs]
+                   if len(outputs) > 1 else {'id': outputs[0][0], 'property': outputs[0][1]},
+        'inputs': [{'id': component, 'property': prop, 'value': value} for component, prop, value in inputs],
+        'changedPropIds': [changed],
+        'state': []
+    }
+
+def random_request(dates, tickers):
+    """One of the dashboard's server callbacks with random inputs, so the figure cache mostly misses"""
+    kind = random.choice(('chart', 'composition', 'changes'))
+    if kind == 'chart':
+        start, end = sorted(random.sample(range(len(dates)), 2))
+        return callback_body(
+            [('performance-chart', 'figure')],
+            [('performance-chart', 'relayoutData', {'xaxis.range[0]': dates[start], 'xaxis.range[1]': dates[end]})],
+            'performance-chart.relayoutData')
+    if kind == 'composition':
+        return callback_body(
+            [('composition-table', 'data'), ('composition-table', 'page_count'),
+             ('composition-table', 'page_current')],
+            [('date-picker', 'date', random.choice(dates)),
+             ('composition-table', 'page_current', random.randrange(10)),
+             ('composition-table', 'page_size', 10),
+             ('composition-table', 'sort_by', []),
+             ('composition-table', 'filter_query', '')],
+            'composition-table.page_current')
+    return callback_body(
+        [('changes-table', 'data'), ('changes-table', 'page_count'), ('changes-table', 'page_current')],
+        [('changes-ticker', 'value', random.choice(tickers)),
+         ('changes-table', 'page_current', 0),
+         ('changes-table', 'page_size', 10),
+         ('changes-table', 'sort_by', []),
+         ('changes-table', 'filter_query', '')],
+        'changes-ticker.value')
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+
+# =============================================
+# Server Control
+# =============================================
+def start_server(workers, port, data_path):
+    process = subprocess.Popen(
+        [sys.executable, 'interactive_dashboard.py', '--serve', '--workers', str(workers), '--port', str(port),
+         '--data-path', data_path, '--no-open-browser'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).read()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"Dashboard server exited with code {process.returncode}")
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Dashboard server did not come up within 120 seconds")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# =============================================
+# Load Test
+# =============================================
+def run_load(url, dates, tickers, concurrency, duration):
+    """Send random callbacks from `concurrency` client threads for `duration` seconds"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < stop_at:
+            body = random_request(dates, tickers)
+            start = time.perf_counter()
+            try:
+                post(url, body)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        'p95_ms': round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dashboard requests/sec against the number of workers")
+    parser.add_argument("--data-path", required=True, help="Directory with the index builder's outputs")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to test")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=8060)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    summary = DashboardData(args.data_path).summary_arrays()
+    dates = summary['dates']
+    changes = DashboardData(args.data_path).changes()
+    tickers = sorted({ticker for column in ('Added_Tickers', 'Removed_Tickers')
+                      for value in changes[column].dropna() for ticker in value.split(', ') if ticker})
+    url = f"http://127.0.0.1:{args.port}/_dash-update-component"
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        process = start_server(workers, args.port, args.data_path)
+        try:
+            run_load(url, dates, tickers, args.concurrency, min(3.0, args.duration))  # warm up
+            result = {'workers': workers, 'concurrency': args.concurrency,
+                      **run_load(url, dates, tickers, args.concurrency, args.duration)}
+        finally:
+            stop_server(process)
+        results.append(result)
+        print(f"{workers} worker(s): {result['requests_per_second']} req/s, "
+              f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, {result['errors']} errors")
+
+    print(f"CPU cores: {os.cpu_count()}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
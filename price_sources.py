@@ -0,0 +1,238 @@
+import os
+import logging
+import pandas as pd
+import yfinance as yf
+from pandas.tseries.holiday import (AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr,
+                                    USPresidentsDay, USMemorialDay, USLaborDay, USThanksgivingDay,
+                                    nearest_workday, sunday_to_monday)
+from pandas.tseries.offsets import CustomBusinessDay
+
+logger = logging.getLogger(__name__)
+
+# =============================================
+# Price Source Interface
+# =============================================
+class PriceSource:
+    """Supplies closing prices and company details to the data fetcher.
+
+    `chunk_size` is the number of tickers the fetcher hands to a single
+    `fetch_history` call, and `default_rate_limit` the requests per second the
+    fetcher allows unless told otherwise (None for unlimited).
+    """
+    chunk_size = 1
+    default_rate_limit = None
+
+    def fetch_history(self, tickers: list, start_date, end_date) -> dict:
+        """Returns {ticker: Series of closing prices indexed by date} for [start_date, end_date).
+
+        Tickers whose request failed are left out of the result; an empty Series means the
+        provider has no data for that range.
+        """
+        raise NotImplementedError
+
+    def fetch_info(self, ticker: str) -> dict:
+        """Returns a dict with at least 'longName' and 'sharesOutstanding' for a ticker."""
+        raise NotImplementedError
+
+# =============================================
+# Yahoo Finance Sources
+# =============================================
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """Regular NYSE full-day holidays (one-off closures are not included)"""
+    rules = [
+        Holiday('NewYearsDay', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-06-19', observance=nearest_workday),
+        Holiday('IndependenceDay', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+TRADING_DAY = CustomBusinessDay(calendar=NYSEHolidayCalendar())
+
+def has_trading_days(start_date, end_date) -> bool:
+    """Whether [start_date, end_date) holds a completed NYSE session.
+
+    Today is left out: its prices may not be published yet when the fetch runs.
+    """
+    last_day = min(pd.Timestamp(end_date).normalize() - pd.Timedelta(days=1),
+                   pd.Timestamp.today().normalize() - pd.Timedelta(days=1))
+    return len(pd.date_range(pd.Timestamp(start_date).normalize(), last_day, freq=TRADING_DAY)) > 0
+
+def _drop_failed(history: dict, start_date, end_date) -> dict:
+    """Treats empty Yahoo responses over a range with trading sessions as failed requests.
+
+    yfinance logs request errors (throttling included) and returns an empty frame instead of
+    raising, so emptiness is checked against the NYSE calendar. Over a range with no sessions
+    (a weekend or market holiday) empty Series mean "no data". Otherwise, if nothing came back
+    at all the whole call is raised as an error so it can be retried and back off; if only some
+    tickers are empty, those are dropped and reported as failed.
+    """
+    if not has_trading_days(start_date, end_date):
+        return history
+    failed = [ticker for ticker, series in history.items() if series.empty]
+    if failed and len(failed) == len(history):
+        raise RuntimeError(f"No price data returned for {', '.join(failed)}")
+    return {ticker: series for ticker, series in history.items() if ticker not in failed}
+
+class YahooTickerSource(PriceSource):
+    """One `yf.Ticker(...).history()` request per ticker."""
+    chunk_size = 1
+    default_rate_limit = 5.0
+
+    def fetch_history(self, tickers, start_date, end_date):
+        history = {
+            ticker: yf.Ticker(ticker).history(start=start_date, end=end_date, interval="1d")["Close"]
+            for ticker in tickers
+        }
+        return _drop_failed(history, start_date, end_date)
+
+    def fetch_info(self, ticker):
+        return yf.Ticker(ticker).info
+
+class YahooBatchSource(PriceSource):
+    """Downloads closing prices for many tickers per request with `yf.download`."""
+    default_rate_limit = 5.0
+
+    def __init__(self, chunk_size: int = 50):
+        self.chunk_size = chunk_size
+
+    def fetch_history(self, tickers, start_date, end_date):
+        history = {}
+        for i in range(0, len(tickers), self.chunk_size):
+            chunk = list(tickers[i:i + self.chunk_size])
+            data = yf.download(chunk, start=start_date, end=end_date, interval="1d",
+                               group_by="ticker", auto_adjust=True, threads=True, progress=False)
+            chunk_history = {ticker: _extract_close(data, ticker, len(chunk)) for ticker in chunk}
+            history.update(_drop_failed(chunk_history, start_date, end_date))
+        return history
+
+    def fetch_info(self, ticker):
+        return yf.Ticker(ticker).info
+
+def _extract_close(data: pd.DataFrame, ticker: str, chunk_len: int) -> pd.Series:
+    """Pulls one ticker's closing prices out of a `yf.download` frame."""
+    if data is None or data.empty:
+        return pd.Series(dtype='float64', name="Close")
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker not in data.columns.get_level_values(0):
+            return pd.Series(dtype='float64', name="Close")
+        close = data[ticker]["Close"]
+    elif chunk_len == 1:
+        close = data["Close"]
+    else:
+        return pd.Series(dtype='float64', name="Close")
+    return close.dropna().rename("Close")
+
+# =============================================
+# Fixture / Replay Sources
+# =============================================
+PRICES_FIXTURE = "prices"        # columns: date, ticker, close_price
+COMPANIES_FIXTURE = "companies"  # columns: ticker, company_name, shares_outstanding
+
+def _read_fixture(directory: str, name: str) -> pd.DataFrame:
+    """Reads `<name>.parquet` or `<name>.csv` from a fixture directory."""
+    parquet_path = os.path.join(directory, f"{name}.parquet")
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    csv_path = os.path.join(directory, f"{name}.csv")
+    if os.path.exists(csv_path):
+        return pd.read_csv(csv_path)
+    raise FileNotFoundError(f"No {name}.parquet or {name}.csv in {directory}")
+
+class FixturePriceSource(PriceSource):
+    """Replays prices and company details recorded to CSV/Parquet, without network access."""
+
+    def __init__(self, directory: str, chunk_size: int = 500):
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+        prices = _read_fixture(directory, PRICES_FIXTURE)
+        prices['date'] = pd.to_datetime(prices['date'])
+        self._prices = {
+            ticker: group.set_index('date')['close_price'].sort_index().rename("Close")
+            for ticker, group in prices.groupby('ticker')
+        }
+
+        companies = _read_fixture(directory, COMPANIES_FIXTURE).set_index('ticker')
+        self._info = {
+            ticker: {"longName": row['company_name'], "sharesOutstanding": row['shares_outstanding']}
+            for ticker, row in companies.iterrows()
+        }
+
+    def fetch_history(self, tickers, start_date, end_date):
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        history = {}
+        for ticker in tickers:
+            series = self._prices.get(ticker)
+            if series is None:
+                history[ticker] = pd.Series(dtype='float64', name="Close")
+            else:
+                history[ticker] = series[(series.index >= start_date) & (series.index < end_date)]
+        return history
+
+    def fetch_info(self, ticker):
+        if ticker not in self._info:
+            raise KeyError(f"No recorded company data for {ticker}")
+        return self._info[ticker]
+
+class RecordingPriceSource(PriceSource):
+    """Wraps another source and keeps everything it returns so it can be saved as a fixture."""
+
+    def __init__(self, source: PriceSource):
+        self.source = source
+        self.chunk_size = source.chunk_size
+        self.default_rate_limit = source.default_rate_limit
+        self._prices = []
+        self._companies = {}
+
+    def fetch_history(self, tickers, start_date, end_date):
+        history = self.source.fetch_history(tickers, start_date, end_date)
+        for ticker, series in history.items():
+            if not series.empty:
+                self._prices.append(pd.DataFrame({
+                    'date': pd.DatetimeIndex(series.index).date,
+                    'ticker': ticker,
+                    'close_price': series.values
+                }))
+        return history
+
+    def fetch_info(self, ticker):
+        info = self.source.fetch_info(ticker)
+        self._companies[ticker] = {
+            'ticker': ticker,
+            'company_name': info.get("longName", ticker),
+            'shares_outstanding': info.get("sharesOutstanding", None)
+        }
+        return info
+
+    def save(self, directory: str, fmt: str = "csv"):
+        """Writes the recorded prices and company details to `directory` as CSV or Parquet."""
+        os.makedirs(directory, exist_ok=True)
+        prices = (pd.concat(self._prices, ignore_index=True) if self._prices
+                  else pd.DataFrame(columns=['date', 'ticker', 'close_price']))
+        companies = pd.DataFrame(list(self._companies.values()),
+                                 columns=['ticker', 'company_name', 'shares_outstanding'])
+        for name, df in ((PRICES_FIXTURE, prices), (COMPANIES_FIXTURE, companies)):
+            path = os.path.join(directory, f"{name}.{fmt}")
+            if fmt == "parquet":
+                df.to_parquet(path, index=False)
+            else:
+                df.to_csv(path, index=False)
+        logger.info(f"Fixture recorded to {directory}")
+
+def make_price_source(name: str, chunk_size: int = None, fixture_dir: str = None) -> PriceSource:
+    """Builds a price source from its command-line name."""
+    if name == "yahoo":
+        return YahooTickerSource()
+    if name == "yahoo-batch":
+        return YahooBatchSource(chunk_size or 50)
+    if name == "fixture":
+        if not fixture_dir:
+            raise ValueError("The fixture source needs --fixture-dir")
+        return FixturePriceSource(fixture_dir, chunk_size or 500)
+    raise ValueError(f"Unknown price source: {name}")
@@ -0,0 +1,142 @@
+import json
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# =============================================
+# Error Classification
+# =============================================
+# Errors that mean the request itself can't succeed (an unknown ticker, a missing field, bad
+# arguments). Repeating them doesn't help and says nothing about how loaded the provider is.
+PERMANENT_ERRORS = (LookupError, ValueError, TypeError, NotImplementedError)
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request is worth repeating (throttling, timeouts, connection errors)."""
+    # Throttled Yahoo responses sometimes surface as undecodable JSON
+    if isinstance(error, json.JSONDecodeError):
+        return True
+    return not isinstance(error, PERMANENT_ERRORS)
+
+# =============================================
+# Token Bucket
+# =============================================
+class TokenBucket:
+    """Caps the request rate at `rate` per second while allowing bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Blocks until `tokens` are available, then takes them.
+
+        A request costing more than the bucket holds waits for a full bucket and leaves it in
+        debt, so the requests after it wait until the rate has paid for it.
+        """
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+# =============================================
+# AIMD Concurrency Limit
+# =============================================
+class AdaptiveConcurrencyLimit:
+    """Limits in-flight requests and adjusts the limit additive-increase / multiplicative-decrease.
+
+    Each success (under `latency_target`, when one is set) grows the limit by 1/limit, so it
+    climbs by about one slot per window of requests. An error or slow response cuts it by
+    `decrease_factor`.
+    """
+
+    def __init__(self, initial: int = 5, minimum: int = 1, maximum: int = 20,
+                 latency_target: float = None, decrease_factor: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, success: bool, latency: float, adjust: bool = True):
+        """Frees a slot; with `adjust`, the request's outcome also moves the limit."""
+        with self._condition:
+            self._in_flight -= 1
+            if not adjust:
+                self._condition.notify_all()
+                return
+            previous = int(self._limit)
+            if success and (self.latency_target is None or latency <= self.latency_target):
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            else:
+                self._limit = max(self.minimum, self._limit * self.decrease_factor)
+            if int(self._limit) < previous:
+                logger.info(f"Fetch concurrency reduced {previous} -> {int(self._limit)}")
+            elif int(self._limit) > previous:
+                logger.debug(f"Fetch concurrency raised {previous} -> {int(self._limit)}")
+            self._condition.notify_all()
+
+# =============================================
+# Request Controller
+# =============================================
+class RequestController:
+    """Runs provider requests through a token bucket, an AIMD concurrency limit and
+    exponential-backoff retries. Permanent errors (see `is_retryable`) are raised at once and
+    leave the concurrency limit unchanged."""
+
+    def __init__(self, bucket: TokenBucket = None, limit: AdaptiveConcurrencyLimit = None,
+                 retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.bucket = bucket
+        self.limit = limit or AdaptiveConcurrencyLimit()
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def call(self, fn, *args, cost: float = 1.0, **kwargs):
+        """Calls `fn`, retrying retryable failures; re-raises the last error once retries run out.
+
+        `cost` is the number of provider requests `fn` makes, charged to the token bucket on
+        every attempt.
+        """
+        for attempt in range(self.retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire(cost)
+            self.limit.acquire()
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                self.limit.release(False, time.perf_counter() - start, adjust=retryable)
+                if not retryable or attempt == self.retries:
+                    raise
+                # Full jitter keeps retrying workers from hitting the provider in lockstep
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+            else:
+                self.limit.release(True, time.perf_counter() - start)
+                return result
@@ -0,0 +1,59 @@
+from functools import partial
+import numpy as np
+
+# =============================================
+# Weighting Schemes
+# =============================================
+# Each scheme maps a dates x tickers market cap matrix and the matching membership mask to
+# weights that sum to 1 across each day's constituents (0 for non-members)
+WEIGHT_CAP = 0.10
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    totals = values.sum(axis=1, keepdims=True)
+    return np.divide(values, totals, out=np.zeros_like(values), where=totals > 0)
+
+def equal_weights(caps: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """The same weight for every constituent"""
+    return _normalize(members.astype('float64'))
+
+def cap_weights(caps: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """Weights proportional to market cap"""
+    return _normalize(np.where(members, caps, 0.0))
+
+def sqrt_cap_weights(caps: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """Weights proportional to the square root of market cap"""
+    return _normalize(np.where(members, np.sqrt(caps), 0.0))
+
+def capped_cap_weights(caps: np.ndarray, members: np.ndarray, cap: float = WEIGHT_CAP) -> np.ndarray:
+    """Cap weights with no constituent above `cap`; the excess goes to the uncapped constituents
+    in proportion to their market caps, repeating until no weight exceeds the cap"""
+    weights = cap_weights(caps, members)
+    capped = np.zeros_like(members)
+    for _ in range(members.shape[1]):
+        over = (weights > cap + 1e-12) & ~capped
+        if not over.any():
+            break
+        capped |= over
+        free_caps = np.where(members & ~capped, caps, 0.0)
+        residual = 1.0 - cap * capped.sum(axis=1, keepdims=True)
+        weights = np.where(capped, cap, _normalize(free_caps) * residual)
+    # Days with too few constituents to stay under the cap fall back to equal weights
+    infeasible = members.sum(axis=1) * cap < 1.0
+    weights[infeasible] = equal_weights(caps[infeasible], members[infeasible])
+    return weights
+
+WEIGHTING_SCHEMES = {
+    'equal': equal_weights,
+    'cap': cap_weights,
+    'capped_cap': capped_cap_weights,
+    'sqrt_cap': sqrt_cap_weights,
+}
+
+def get_schemes(names, cap: float = WEIGHT_CAP) -> dict:
+    """Weighting functions by name, in the order given; raises ValueError for unknown names"""
+    unknown = [name for name in names if name not in WEIGHTING_SCHEMES]
+    if unknown:
+        raise ValueError(f"Unknown weighting schemes {', '.join(unknown)} "
+                         f"(available: {', '.join(WEIGHTING_SCHEMES)})")
+    return {name: partial(capped_cap_weights, cap=cap) if name == 'capped_cap' else WEIGHTING_SCHEMES[name]
+            for name in names}